@@ -1,16 +1,39 @@
 from fastapi import APIRouter, HTTPException, Depends, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import ORJSONResponse, Response
 from fastapi.security import OAuth2PasswordRequestForm
 from datetime import timedelta
 from typing import List, Optional
 from pydantic import BaseModel
+import math
+import orjson
+import sqlite3
+import time
 
-from ..database import get_db, hash_password
-from ..auth import create_access_token, verify_password, get_current_user, ACCESS_TOKEN_EXPIRE_MINUTES
+from ..database import get_db, hash_password, is_legacy_password_hash, BCRYPT_COST
+from ..auth import create_access_token, verify_password, get_current_user, get_current_admin_user, invalidate_user_cache, ACCESS_TOKEN_EXPIRE_MINUTES
 from ..models import UserCreate, UserResponse, LoginRequest, LoginResponse
 from ..timezone_utils import get_timezone_list, validate_timezone
+from ..utils import stream_json_array
 
 router = APIRouter()
 
+# Verified against when the user doesn't exist, so response time doesn't reveal it
+_DUMMY_HASH = hash_password("unused")
+
+def _user_payload(row) -> dict:
+    """Convert a users row to the UserResponse shape"""
+    return {
+        "id": row["id"],
+        "username": row["username"],
+        "email": row["email"],
+        "theme": row["theme"],
+        "timezone": row["timezone"],
+        "is_admin": bool(row["is_admin"]),
+        "created_at": row["created_at"],
+        "last_login_at": row["last_login_at"]
+    }
+
 @router.post("/login", response_model=LoginResponse)
 async def login(login_data: LoginRequest):
     """Authenticate user and return access token"""
@@ -20,19 +43,35 @@ async def login(login_data: LoginRequest):
             (login_data.username,)
         )
         user = cursor.fetchone()
-        
-        if not user or not verify_password(login_data.password, user["password_hash"]):
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Incorrect username or password",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
-        
-        # Update last login
-        conn.execute(
-            "UPDATE users SET last_login_at = CURRENT_TIMESTAMP WHERE id = ?",
-            (user["id"],)
+    
+    # Verify outside the connection so it isn't held idle during hashing
+    password_hash = user["password_hash"] if user else _DUMMY_HASH
+    password_ok = await run_in_threadpool(verify_password, login_data.password, password_hash)
+    if not user or not password_ok:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Incorrect username or password",
+            headers={"WWW-Authenticate": "Bearer"},
         )
+    
+    # Upgrade legacy SHA-256 hashes to bcrypt; the verified legacy digest is the prehash
+    upgraded_hash = None
+    if is_legacy_password_hash(user["password_hash"]):
+        upgraded_hash = await run_in_threadpool(hash_password, user["password_hash"].encode())
+    
+    with get_db() as conn:
+        # Update last login, and the password hash only when it was upgraded
+        if upgraded_hash:
+            conn.execute(
+                "UPDATE users SET last_login_at = CURRENT_TIMESTAMP, password_hash = ? WHERE id = ?",
+                (upgraded_hash, user["id"])
+            )
+        else:
+            conn.execute(
+                "UPDATE users SET last_login_at = CURRENT_TIMESTAMP WHERE id = ?",
+                (user["id"],)
+            )
+        invalidate_user_cache(user["username"])
         
         access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
         access_token = create_access_token(
@@ -56,38 +95,50 @@ async def login(login_data: LoginRequest):
             user=user_response
         )
 
+def ensure_user_available(conn: sqlite3.Connection, user_data: UserCreate):
+    """Raise a 400 if the username or email is taken (username reported first)"""
+    cursor = conn.execute("""
+        SELECT username = ? AS username_taken, email = ? AS email_taken
+        FROM users
+        WHERE username = ? OR email = ?
+        ORDER BY username_taken DESC
+        LIMIT 1
+    """, (user_data.username, user_data.email, user_data.username, user_data.email))
+    existing = cursor.fetchone()
+    
+    if existing and existing["username_taken"]:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Username already exists"
+        )
+    
+    if existing and existing["email_taken"]:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Email already exists"
+        )
+
 @router.post("/register", response_model=UserResponse)
 async def register(user_data: UserCreate):
     """Register a new user"""
     with get_db() as conn:
-        # Check if username already exists
-        cursor = conn.execute("SELECT id FROM users WHERE username = ?", (user_data.username,))
-        if cursor.fetchone():
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Username already exists"
-            )
-        
-        # Check if email already exists
-        cursor = conn.execute("SELECT id FROM users WHERE email = ?", (user_data.email,))
-        if cursor.fetchone():
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Email already exists"
-            )
-        
-        # Create user
-        hashed_password = hash_password(user_data.password)
-        cursor = conn.execute("""
-            INSERT INTO users (username, email, password_hash, is_admin)
-            VALUES (?, ?, ?, ?)
-        """, (user_data.username, user_data.email, hashed_password, False))
-        
-        user_id = cursor.lastrowid
-        
-        # Get created user
-        cursor = conn.execute("SELECT * FROM users WHERE id = ?", (user_id,))
-        user = cursor.fetchone()
+        ensure_user_available(conn, user_data)
+    
+    # Hash in the threadpool so other requests keep running meanwhile
+    hashed_password = await run_in_threadpool(hash_password, user_data.password)
+    
+    with get_db() as conn:
+        # Create user; a registration that raced past the check above fails here
+        try:
+            cursor = conn.execute("""
+                INSERT INTO users (username, email, password_hash, is_admin)
+                VALUES (?, ?, ?, ?)
+                RETURNING *
+            """, (user_data.username, user_data.email, hashed_password, False))
+            user = cursor.fetchone()
+        except sqlite3.IntegrityError:
+            ensure_user_available(conn, user_data)
+            raise
         
         return UserResponse(
             id=user["id"],
@@ -103,16 +154,16 @@ async def register(user_data: UserCreate):
 @router.get("/me", response_model=UserResponse)
 async def get_current_user_info(current_user: dict = Depends(get_current_user)):
     """Get current user information"""
-    return UserResponse(
-        id=current_user["id"],
-        username=current_user["username"],
-        email=current_user["email"],
-        theme=current_user["theme"],
-        timezone=current_user["timezone"],
-        is_admin=current_user["is_admin"],
-        created_at=current_user["created_at"],
-        last_login_at=current_user["last_login_at"]
-    )
+    # Built from a trusted row; returning the response directly skips
+    # re-validating it against response_model (kept for the OpenAPI schema)
+    return ORJSONResponse(_user_payload(current_user))
+
+# Fixed statement text per field combination so sqlite3's statement cache is reused
+_UPDATE_USER_QUERIES = {
+    ("theme",): "UPDATE users SET theme = ? WHERE id = ?",
+    ("timezone",): "UPDATE users SET timezone = ? WHERE id = ?",
+    ("theme", "timezone"): "UPDATE users SET theme = ?, timezone = ? WHERE id = ?",
+}
 
 class UserUpdateRequest(BaseModel):
     theme: Optional[str] = None
@@ -125,11 +176,11 @@ async def update_current_user(
 ):
     """Update current user preferences"""
     with get_db() as conn:
-        updates = []
+        fields = []
         params = []
         
         if update_data.theme is not None:
-            updates.append("theme = ?")
+            fields.append("theme")
             params.append(update_data.theme)
         
         if update_data.timezone is not None:
@@ -138,28 +189,19 @@ async def update_current_user(
                     status_code=status.HTTP_400_BAD_REQUEST,
                     detail="Invalid timezone"
                 )
-            updates.append("timezone = ?")
+            fields.append("timezone")
             params.append(update_data.timezone)
         
-        if updates:
-            query = f"UPDATE users SET {', '.join(updates)} WHERE id = ?"
+        if fields:
             params.append(current_user["id"])
-            conn.execute(query, params)
+            conn.execute(_UPDATE_USER_QUERIES[tuple(fields)], params)
+            invalidate_user_cache(current_user["username"])
         
         # Get updated user
         cursor = conn.execute("SELECT * FROM users WHERE id = ?", (current_user["id"],))
         user = cursor.fetchone()
         
-        return UserResponse(
-            id=user["id"],
-            username=user["username"],
-            email=user["email"],
-            theme=user["theme"],
-            timezone=user["timezone"],
-            is_admin=user["is_admin"],
-            created_at=user["created_at"],
-            last_login_at=user["last_login_at"]
-        )
+        return ORJSONResponse(_user_payload(user))
 
 @router.get("/users", response_model=List[UserResponse])
 async def list_users(current_user: dict = Depends(get_current_user)):
@@ -170,23 +212,42 @@ async def list_users(current_user: dict = Depends(get_current_user)):
             detail="Not enough permissions"
         )
     
-    with get_db() as conn:
-        cursor = conn.execute("SELECT * FROM users ORDER BY created_at DESC")
-        users = []
-        for row in cursor.fetchall():
-            users.append(UserResponse(
-                id=row["id"],
-                username=row["username"],
-                email=row["email"],
-                theme=row["theme"],
-                timezone=row["timezone"],
-                is_admin=row["is_admin"],
-                created_at=row["created_at"],
-                last_login_at=row["last_login_at"]
-            ))
-        return users
+    return stream_json_array("""
+        SELECT id, username, email, theme, timezone, is_admin, created_at, last_login_at
+        FROM users ORDER BY created_at DESC
+    """, transform=_user_payload)
+
+# Target time for a single password hash when suggesting a bcrypt cost
+BCRYPT_TARGET_MS = 250
+
+def _time_password_hashes(samples: int) -> float:
+    """Average milliseconds per hash_password call at the configured cost"""
+    start = time.perf_counter()
+    for _ in range(samples):
+        hash_password("benchmark-password")
+    return (time.perf_counter() - start) * 1000 / samples
+
+@router.get("/admin/bench-bcrypt")
+async def bench_bcrypt(current_user: dict = Depends(get_current_admin_user)):
+    """Benchmark password hashing and suggest a bcrypt cost (admin only)"""
+    samples = 5
+    avg_ms = await run_in_threadpool(_time_password_hashes, samples)
+    
+    # Each cost step doubles hashing time
+    suggested_cost = BCRYPT_COST + round(math.log2(BCRYPT_TARGET_MS / avg_ms))
+    
+    return {
+        "cost": BCRYPT_COST,
+        "samples": samples,
+        "avg_ms": round(avg_ms, 1),
+        "target_ms": BCRYPT_TARGET_MS,
+        "suggested_cost": max(4, min(31, suggested_cost))
+    }
+
+# Timezone choices never change at runtime, so serialize them once
+_TIMEZONES_JSON = orjson.dumps(get_timezone_list())
 
 @router.get("/timezones")
 async def get_timezones():
     """Get list of available timezones"""
-    return get_timezone_list()
\ No newline at end of file
+    return Response(content=_TIMEZONES_JSON, media_type="application/json")
\ No newline at end of file
@@ -1,75 +1,55 @@
 from fastapi import APIRouter, HTTPException, Depends
+from fastapi.responses import ORJSONResponse, Response
 from typing import List, Optional, Dict, Any
 from datetime import datetime, timedelta
 import json
 import re
+import orjson
 from croniter import croniter
 
 from ..database import get_db
 from ..auth import get_current_user
 from ..models import TriggerCreate, TriggerResponse, CronValidationRequest
-from ..timezone_utils import format_datetime_for_api
+from ..timezone_utils import format_datetime_for_api, format_timestamp_for_api
+from ..utils import stream_json_array
 
 router = APIRouter()
 
+# Valid ranges for each CRON field (minute hour day month weekday)
+CRON_FIELD_RANGES = [
+    (0, 59),   # minute
+    (0, 23),   # hour
+    (1, 31),   # day
+    (1, 12),   # month
+    (0, 6),    # weekday
+]
+
+def _cron_field_pattern(low: int, high: int) -> str:
+    """Build a regex accepting '*', N, N-N, */N, N/N or N,N,... within range"""
+    value = "0*(?:" + "|".join(str(v) for v in range(high, low - 1, -1)) + ")"
+    step = r"0*[1-9]\d*"
+    return (
+        rf"\*"
+        rf"|(?P<start>{value})-(?P<end>{value})"
+        rf"|(?:\*|{value})/{step}"
+        rf"|{value}(?:,{value})*"
+    )
+
+_CRON_FIELD_RES = [re.compile(_cron_field_pattern(low, high)) for low, high in CRON_FIELD_RANGES]
+
 def validate_cron_expression(expression: str) -> bool:
     """Validate CRON expression format"""
-    # Basic CRON validation (minute hour day month weekday)
     parts = expression.split()
     if len(parts) != 5:
         return False
     
-    # Define valid ranges for each field
-    ranges = [
-        (0, 59),   # minute
-        (0, 23),   # hour
-        (1, 31),   # day
-        (1, 12),   # month
-        (0, 6),    # weekday
-    ]
-    
-    for i, part in enumerate(parts):
-        if part == '*':
-            continue
-        
-        # Handle ranges (e.g., "1-5")
-        if '-' in part:
-            try:
-                start, end = map(int, part.split('-'))
-                if start < ranges[i][0] or end > ranges[i][1] or start > end:
-                    return False
-            except ValueError:
-                return False
-        # Handle step values (e.g., "*/5")
-        elif '/' in part:
-            try:
-                base, step = part.split('/')
-                if base != '*':
-                    base_val = int(base)
-                    if base_val < ranges[i][0] or base_val > ranges[i][1]:
-                        return False
-                step_val = int(step)
-                if step_val <= 0:
-                    return False
-            except ValueError:
-                return False
-        # Handle lists (e.g., "1,3,5")
-        elif ',' in part:
-            try:
-                values = [int(x) for x in part.split(',')]
-                for val in values:
-                    if val < ranges[i][0] or val > ranges[i][1]:
-                        return False
-            except ValueError:
-                return False
-        # Handle single values
-        else:
-            try:
-                val = int(part)
-                if val < ranges[i][0] or val > ranges[i][1]:
-                    return False
-            except ValueError:
-                return False
+    for field_re, part in zip(_CRON_FIELD_RES, parts):
+        match = field_re.fullmatch(part)
+        if not match:
+            return False
+        # Ranges must also be ascending (e.g. "1-5", not "5-1")
+        if match.group("start") is not None and int(match.group("start")) > int(match.group("end")):
+            return False
     
     return True
 
@@ -98,57 +78,79 @@ def calculate_next_run_time(trigger_type: str, config: dict) -> Optional[datetim
     else:  # manual
         return None
 
+TRIGGER_DATETIME_FIELDS = ('created_at', 'last_triggered_at', 'next_run_at')
+
+# Parsed trigger configs keyed by (trigger_id, updated_at); updated_at is
+# bumped whenever a trigger is written, so stale entries are never hit
+CONFIG_CACHE_MAX_SIZE = 4096
+_config_cache: Dict[tuple, Dict[str, Any]] = {}
+
+def _parse_config(trigger_id: int, updated_at: Optional[str], raw: str) -> Dict[str, Any]:
+    """Parse trigger config JSON, reusing the result while the trigger is unchanged"""
+    if updated_at is None:
+        return orjson.loads(raw)
+    
+    key = (trigger_id, updated_at)
+    config = _config_cache.get(key)
+    if config is None:
+        if len(_config_cache) >= CONFIG_CACHE_MAX_SIZE:
+            _config_cache.clear()
+        config = _config_cache[key] = orjson.loads(raw)
+    return config
+
+def _trigger_payload(row) -> dict:
+    """Convert a triggers row to the TriggerResponse shape"""
+    trigger_dict = dict(row)
+    # Format datetime fields for API response
+    for field in TRIGGER_DATETIME_FIELDS:
+        trigger_dict[field] = format_timestamp_for_api(trigger_dict[field])
+    updated_at = trigger_dict.pop("updated_at", None)
+    trigger_dict["config"] = _parse_config(trigger_dict["id"], updated_at, trigger_dict["config"])
+    trigger_dict["enabled"] = bool(trigger_dict["enabled"])
+    return trigger_dict
+
 @router.get("/status")
 async def get_execution_status(current_user: dict = Depends(get_current_user)):
     """Get current execution status"""
     with get_db() as conn:
-        # Get running executions
-        cursor = conn.execute("""
-            SELECT el.*, s.name as script_name
-            FROM execution_logs el
-            JOIN scripts s ON el.script_id = s.id
-            WHERE el.status = 'running'
-            ORDER BY el.started_at DESC
-        """)
-        
-        running_executions = []
-        for row in cursor.fetchall():
-            running_executions.append({
-                "id": row["id"],
-                "script_id": row["script_id"],
-                "script_name": row["script_name"],
-                "started_at": row["started_at"],
-                "duration_ms": int((datetime.now() - datetime.fromisoformat(row["started_at"])).total_seconds() * 1000)
-            })
-        
-        # Get recent executions
+        # SQLite builds the whole JSON document; running executions get their
+        # elapsed time computed in SQL and are served in order by idx_execution_logs_status
         cursor = conn.execute("""
-            SELECT el.*, s.name as script_name
-            FROM execution_logs el
-            JOIN scripts s ON el.script_id = s.id
-            WHERE el.status != 'running'
-            ORDER BY el.started_at DESC
-            LIMIT 10
+            WITH running AS (
+                SELECT el.id, el.script_id, s.name as script_name, el.started_at,
+                       CAST((julianday('now') - julianday(el.started_at)) * 86400000 AS INTEGER) as duration_ms
+                FROM execution_logs el
+                JOIN scripts s ON el.script_id = s.id
+                WHERE el.status = 'running'
+                ORDER BY el.started_at DESC
+            ), recent AS (
+                SELECT el.id, el.script_id, s.name as script_name, el.started_at, el.finished_at,
+                       el.duration_ms, el.status, el.exit_code
+                FROM execution_logs el
+                JOIN scripts s ON el.script_id = s.id
+                WHERE el.status != 'running'
+                ORDER BY el.started_at DESC
+                LIMIT 10
+            )
+            SELECT json_object(
+                'running_executions', (
+                    SELECT json_group_array(json_object(
+                        'id', id, 'script_id', script_id, 'script_name', script_name,
+                        'started_at', started_at, 'duration_ms', duration_ms
+                    )) FROM running
+                ),
+                'recent_executions', (
+                    SELECT json_group_array(json_object(
+                        'id', id, 'script_id', script_id, 'script_name', script_name,
+                        'started_at', started_at, 'finished_at', finished_at,
+                        'duration_ms', duration_ms, 'status', status, 'exit_code', exit_code
+                    )) FROM recent
+                ),
+                'total_running', (SELECT COUNT(*) FROM running)
+            )
         """)
         
-        recent_executions = []
-        for row in cursor.fetchall():
-            recent_executions.append({
-                "id": row["id"],
-                "script_id": row["script_id"],
-                "script_name": row["script_name"],
-                "started_at": row["started_at"],
-                "finished_at": row["finished_at"],
-                "duration_ms": row["duration_ms"],
-                "status": row["status"],
-                "exit_code": row["exit_code"]
-            })
-        
-        return {
-            "running_executions": running_executions,
-            "recent_executions": recent_executions,
-            "total_running": len(running_executions)
-        }
+        return Response(cursor.fetchone()[0], media_type="application/json")
 
 @router.post("/triggers", response_model=TriggerResponse)
 async def create_trigger(
@@ -179,30 +181,23 @@ async def create_trigger(
         
         # Create trigger
         cursor = conn.execute("""
-            INSERT INTO triggers (script_id, trigger_type, config, enabled, next_run_at)
-            VALUES (?, ?, ?, ?, ?)
+            INSERT INTO triggers (script_id, trigger_type, config, enabled, next_run_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, strftime('%Y-%m-%d %H:%M:%f', 'now'))
+            RETURNING *
         """, (trigger.script_id, trigger.trigger_type, json.dumps(trigger.config), trigger.enabled, 
               format_datetime_for_api(next_run_at) if next_run_at else None))
-        
-        trigger_id = cursor.lastrowid
-        
-        # Return created trigger
-        cursor = conn.execute("SELECT * FROM triggers WHERE id = ?", (trigger_id,))
         created_trigger = cursor.fetchone()
         
         # Format datetime fields for API response
         trigger_dict = dict(created_trigger)
-        datetime_fields = ['created_at', 'last_triggered_at', 'next_run_at']
-        for field in datetime_fields:
-            if trigger_dict.get(field):
-                dt = datetime.fromisoformat(trigger_dict[field].replace('Z', '+00:00'))
-                trigger_dict[field] = format_datetime_for_api(dt)
+        for field in TRIGGER_DATETIME_FIELDS:
+            trigger_dict[field] = format_timestamp_for_api(trigger_dict[field])
         
         return TriggerResponse(
             id=trigger_dict["id"],
             script_id=trigger_dict["script_id"],
             trigger_type=trigger_dict["trigger_type"],
-            config=json.loads(trigger_dict["config"]),
+            config=orjson.loads(trigger_dict["config"]),
             enabled=trigger_dict["enabled"],
             created_at=trigger_dict["created_at"],
             last_triggered_at=trigger_dict["last_triggered_at"],
@@ -215,39 +210,48 @@ async def list_triggers(
     current_user: dict = Depends(get_current_user)
 ):
     """List all triggers or triggers for a specific script"""
+    query = "SELECT * FROM triggers"
+    params = []
+    
+    if script_id:
+        query += " WHERE script_id = ?"
+        params.append(script_id)
+    
+    query += " ORDER BY created_at DESC"
+    
+    return stream_json_array(query, params, transform=_trigger_payload)
+
+@router.get("/triggers/upcoming")
+async def get_upcoming_triggers(
+    limit: int = 10,
+    current_user: dict = Depends(get_current_user)
+):
+    """Get upcoming trigger executions"""
     with get_db() as conn:
-        query = "SELECT * FROM triggers"
-        params = []
-        
-        if script_id:
-            query += " WHERE script_id = ?"
-            params.append(script_id)
-        
-        query += " ORDER BY created_at DESC"
+        cursor = conn.execute("""
+            SELECT t.*, s.name as script_name
+            FROM triggers t
+            JOIN scripts s ON t.script_id = s.id
+            WHERE t.enabled = 1
+            AND t.next_run_at IS NOT NULL
+            ORDER BY t.next_run_at ASC
+            LIMIT ?
+        """, (limit,))
         
-        cursor = conn.execute(query, params)
-        triggers = []
+        upcoming = []
         for row in cursor.fetchall():
-            # Format datetime fields for API response
-            trigger_dict = dict(row)
-            datetime_fields = ['created_at', 'last_triggered_at', 'next_run_at']
-            for field in datetime_fields:
-                if trigger_dict.get(field):
-                    dt = datetime.fromisoformat(trigger_dict[field].replace('Z', '+00:00'))
-                    trigger_dict[field] = format_datetime_for_api(dt)
-            
-            triggers.append(TriggerResponse(
-                id=trigger_dict["id"],
-                script_id=trigger_dict["script_id"],
-                trigger_type=trigger_dict["trigger_type"],
-                config=json.loads(trigger_dict["config"]),
-                enabled=trigger_dict["enabled"],
-                created_at=trigger_dict["created_at"],
-                last_triggered_at=trigger_dict["last_triggered_at"],
-                next_run_at=trigger_dict["next_run_at"]
-            ))
+            upcoming.append({
+                "id": row["id"],
+                "script_id": row["script_id"],
+                "script_name": row["script_name"],
+                "trigger_type": row["trigger_type"],
+                "config": _parse_config(row["id"], row["updated_at"], row["config"]),
+                "next_run_at": row["next_run_at"],
+                # Stored as ISO 8601; trim to "YYYY-MM-DD HH:MM:SS" without parsing
+                "next_run_description": row["next_run_at"][:19].replace("T", " ")
+            })
         
-        return triggers
+        return upcoming
 
 @router.get("/triggers/{trigger_id}", response_model=TriggerResponse)
 async def get_trigger(
@@ -262,24 +266,8 @@ async def get_trigger(
         if not trigger:
             raise HTTPException(404, "Trigger not found")
         
-        # Format datetime fields for API response
-        trigger_dict = dict(trigger)
-        datetime_fields = ['created_at', 'last_triggered_at', 'next_run_at']
-        for field in datetime_fields:
-            if trigger_dict.get(field):
-                dt = datetime.fromisoformat(trigger_dict[field].replace('Z', '+00:00'))
-                trigger_dict[field] = format_datetime_for_api(dt)
-        
-        return TriggerResponse(
-            id=trigger_dict["id"],
-            script_id=trigger_dict["script_id"],
-            trigger_type=trigger_dict["trigger_type"],
-            config=json.loads(trigger_dict["config"]),
-            enabled=trigger_dict["enabled"],
-            created_at=trigger_dict["created_at"],
-            last_triggered_at=trigger_dict["last_triggered_at"],
-            next_run_at=trigger_dict["next_run_at"]
-        )
+        # Skip response_model re-validation of an already-shaped payload
+        return ORJSONResponse(_trigger_payload(trigger))
 
 @router.put("/triggers/{trigger_id}")
 async def update_trigger(
@@ -293,7 +281,8 @@ async def update_trigger(
             UPDATE triggers SET
                 trigger_type = ?,
                 config = ?,
-                enabled = ?
+                enabled = ?,
+                updated_at = strftime('%Y-%m-%d %H:%M:%f', 'now')
             WHERE id = ?
         """, (trigger.trigger_type, json.dumps(trigger.config), trigger.enabled, trigger_id))
         
@@ -324,19 +313,20 @@ async def toggle_trigger(
     """Toggle trigger enabled/disabled"""
     with get_db() as conn:
         cursor = conn.execute("""
-            UPDATE triggers SET enabled = NOT enabled WHERE id = ?
+            UPDATE triggers SET
+                enabled = NOT enabled,
+                updated_at = strftime('%Y-%m-%d %H:%M:%f', 'now')
+            WHERE id = ?
+            RETURNING enabled
         """, (trigger_id,))
+        trigger = cursor.fetchone()
         
-        if cursor.rowcount == 0:
+        if not trigger:
             raise HTTPException(404, "Trigger not found")
         
-        # Get updated trigger
-        cursor = conn.execute("SELECT enabled FROM triggers WHERE id = ?", (trigger_id,))
-        trigger = cursor.fetchone()
-        
         return {
             "success": True,
-            "enabled": trigger["enabled"],
+            "enabled": bool(trigger["enabled"]),
             "message": f"Trigger {'enabled' if trigger['enabled'] else 'disabled'}"
         }
 
@@ -360,13 +350,11 @@ async def validate_cron(
     if not validate_cron_expression(request.expression):
         raise HTTPException(400, "Invalid CRON expression")
     
-    # Calculate next few run times (simplified)
+    # Calculate the next few real run times
+    cron = croniter(request.expression, datetime.now())
     next_runs = []
-    base_time = datetime.now()
-    
-    # For demo purposes, show next 5 theoretical runs
-    for i in range(5):
-        next_time = base_time + timedelta(hours=i+1)  # Simplified calculation
+    for _ in range(5):
+        next_time = cron.get_next(datetime)
         next_runs.append({
             "time": next_time.isoformat(),
             "description": next_time.strftime("%Y-%m-%d %H:%M:%S")
@@ -377,34 +365,3 @@ async def validate_cron(
         "next_runs": next_runs,
         "description": f"CRON expression: {request.expression}"
     }
-
-@router.get("/triggers/upcoming")
-async def get_upcoming_triggers(
-    limit: int = 10,
-    current_user: dict = Depends(get_current_user)
-):
-    """Get upcoming trigger executions"""
-    with get_db() as conn:
-        cursor = conn.execute("""
-            SELECT t.*, s.name as script_name
-            FROM triggers t
-            JOIN scripts s ON t.script_id = s.id
-            WHERE t.enabled = true 
-            AND t.next_run_at IS NOT NULL
-            ORDER BY t.next_run_at ASC
-            LIMIT ?
-        """, (limit,))
-        
-        upcoming = []
-        for row in cursor.fetchall():
-            upcoming.append({
-                "id": row["id"],
-                "script_id": row["script_id"],
-                "script_name": row["script_name"],
-                "trigger_type": row["trigger_type"],
-                "config": json.loads(row["config"]),
-                "next_run_at": row["next_run_at"],
-                "next_run_description": datetime.fromisoformat(row["next_run_at"]).strftime("%Y-%m-%d %H:%M:%S") if row["next_run_at"] else None
-            })
-        
-        return upcoming
\ No newline at end of file
@@ -1,27 +1,56 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Response
 from typing import List
+import sqlite3
+import time
+import orjson
 
 from ..database import get_db
 from ..auth import get_current_user
 from ..models import FolderCreate, FolderResponse
+from ..utils import stream_json_array, invalidate_folder_paths
 
 router = APIRouter()
 
+FOLDER_TREE_TTL_SECONDS = 30
+
+# Folders are shared by all users, so a single cached tree serves everyone
+_folder_tree_cache = {"expires_at": 0.0, "body": None}
+
+def invalidate_folder_tree_cache():
+    """Drop the cached folder tree after a folder change"""
+    _folder_tree_cache["body"] = None
+
+def _load_folder_tree() -> bytes:
+    """Return the full folder hierarchy as JSON, cached for a short TTL"""
+    now = time.monotonic()
+    body = _folder_tree_cache["body"]
+    if body is not None and now < _folder_tree_cache["expires_at"]:
+        return body
+    
+    with get_db() as conn:
+        cursor = conn.execute("""
+            WITH RECURSIVE tree(id, name, parent_id, created_at, depth, path) AS (
+                SELECT id, name, parent_id, created_at, 0, name
+                FROM folders WHERE parent_id IS NULL
+                UNION ALL
+                SELECT f.id, f.name, f.parent_id, f.created_at, t.depth + 1, t.path || '/' || f.name
+                FROM folders f JOIN tree t ON f.parent_id = t.id
+            )
+            SELECT * FROM tree ORDER BY path
+        """)
+        body = orjson.dumps([dict(row) for row in cursor])
+    
+    _folder_tree_cache["body"] = body
+    _folder_tree_cache["expires_at"] = now + FOLDER_TREE_TTL_SECONDS
+    return body
+
 @router.get("/", response_model=List[FolderResponse])
 @router.get("", response_model=List[FolderResponse])
-async def list_folders(current_user: dict = Depends(get_current_user)):
-    """Get all folders"""
-    with get_db() as conn:
-        cursor = conn.execute("SELECT * FROM folders ORDER BY name")
-        folders = []
-        for row in cursor.fetchall():
-            folders.append(FolderResponse(
-                id=row["id"],
-                name=row["name"],
-                parent_id=row["parent_id"],
-                created_at=row["created_at"]
-            ))
-        return folders
+async def list_folders(tree: bool = False, current_user: dict = Depends(get_current_user)):
+    """Get all folders, or the whole hierarchy with depth and path when tree=true"""
+    if tree:
+        return Response(_load_folder_tree(), media_type="application/json")
+    return stream_json_array("SELECT id, name, parent_id, created_at FROM folders ORDER BY name")
 
 @router.post("/", response_model=FolderResponse)
 @router.post("", response_model=FolderResponse)
@@ -31,26 +60,19 @@ async def create_folder(
 ):
     """Create a new folder"""
     with get_db() as conn:
-        # Check if folder name already exists in parent
-        cursor = conn.execute(
-            "SELECT id FROM folders WHERE name = ? AND parent_id = ?",
-            (folder.name, folder.parent_id)
-        )
-        if cursor.fetchone():
-            raise HTTPException(400, "Folder name already exists in parent folder")
-        
-        # Create folder
+        # Create folder; no row comes back if the name already exists in parent
         cursor = conn.execute("""
             INSERT INTO folders (name, parent_id)
             VALUES (?, ?)
+            ON CONFLICT(name, parent_id) DO NOTHING
+            RETURNING *
         """, (folder.name, folder.parent_id))
-        
-        folder_id = cursor.lastrowid
-        
-        # Return created folder
-        cursor = conn.execute("SELECT * FROM folders WHERE id = ?", (folder_id,))
         created_folder = cursor.fetchone()
         
+        if not created_folder:
+            raise HTTPException(400, "Folder name already exists in parent folder")
+        
+        invalidate_folder_tree_cache()
         return FolderResponse(
             id=created_folder["id"],
             name=created_folder["name"],
@@ -86,31 +108,24 @@ async def update_folder(
 ):
     """Update folder"""
     with get_db() as conn:
-        # Check if folder exists
-        cursor = conn.execute("SELECT * FROM folders WHERE id = ?", (folder_id,))
-        existing_folder = cursor.fetchone()
-        
-        if not existing_folder:
-            raise HTTPException(404, "Folder not found")
-        
-        # Check if new name conflicts with existing folder in parent
-        cursor = conn.execute(
-            "SELECT id FROM folders WHERE name = ? AND parent_id = ? AND id != ?",
-            (folder.name, folder.parent_id, folder_id)
-        )
-        if cursor.fetchone():
+        # Update folder; the UNIQUE(name, parent_id) constraint catches conflicts
+        try:
+            cursor = conn.execute("""
+                UPDATE folders SET name = ?, parent_id = ?
+                WHERE id = ?
+                RETURNING *
+            """, (folder.name, folder.parent_id, folder_id))
+            updated_folder = cursor.fetchone()
+        except sqlite3.IntegrityError as e:
+            if "UNIQUE" not in str(e):
+                raise
             raise HTTPException(400, "Folder name already exists in parent folder")
         
-        # Update folder
-        cursor = conn.execute("""
-            UPDATE folders SET name = ?, parent_id = ?
-            WHERE id = ?
-        """, (folder.name, folder.parent_id, folder_id))
-        
-        # Return updated folder
-        cursor = conn.execute("SELECT * FROM folders WHERE id = ?", (folder_id,))
-        updated_folder = cursor.fetchone()
+        if not updated_folder:
+            raise HTTPException(404, "Folder not found")
         
+        invalidate_folder_tree_cache()
+        invalidate_folder_paths()
         return FolderResponse(
             id=updated_folder["id"],
             name=updated_folder["name"],
@@ -125,26 +140,26 @@ async def delete_folder(
 ):
     """Delete folder"""
     with get_db() as conn:
-        # Check if folder exists
-        cursor = conn.execute("SELECT * FROM folders WHERE id = ?", (folder_id,))
-        if not cursor.fetchone():
+        # Foreign keys on scripts.folder_id and folders.parent_id reject
+        # deleting a folder that is still in use
+        try:
+            cursor = conn.execute("DELETE FROM folders WHERE id = ? RETURNING id", (folder_id,))
+            deleted = cursor.fetchone()
+        except sqlite3.IntegrityError:
+            cursor = conn.execute("""
+                SELECT
+                    (SELECT COUNT(*) FROM scripts WHERE folder_id = ?) AS script_count,
+                    (SELECT COUNT(*) FROM folders WHERE parent_id = ?) AS subfolder_count
+            """, (folder_id, folder_id))
+            usage = cursor.fetchone()
+            
+            if usage["script_count"] > 0:
+                raise HTTPException(400, f"Cannot delete folder with {usage['script_count']} scripts")
+            raise HTTPException(400, f"Cannot delete folder with {usage['subfolder_count']} subfolders")
+        
+        if not deleted:
             raise HTTPException(404, "Folder not found")
         
-        # Check if folder has scripts
-        cursor = conn.execute("SELECT COUNT(*) FROM scripts WHERE folder_id = ?", (folder_id,))
-        script_count = cursor.fetchone()[0]
-        
-        if script_count > 0:
-            raise HTTPException(400, f"Cannot delete folder with {script_count} scripts")
-        
-        # Check if folder has subfolders
-        cursor = conn.execute("SELECT COUNT(*) FROM folders WHERE parent_id = ?", (folder_id,))
-        subfolder_count = cursor.fetchone()[0]
-        
-        if subfolder_count > 0:
-            raise HTTPException(400, f"Cannot delete folder with {subfolder_count} subfolders")
-        
-        # Delete folder
-        cursor = conn.execute("DELETE FROM folders WHERE id = ?", (folder_id,))
-        
+        invalidate_folder_tree_cache()
+        invalidate_folder_paths()
         return {"success": True, "message": "Folder deleted successfully"}
\ No newline at end of file
@@ -1,14 +1,107 @@
-from fastapi import APIRouter, HTTPException, Depends
-from typing import List, Optional
-from datetime import datetime
+from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi.responses import ORJSONResponse, Response
+from typing import Callable, List, Optional
+import base64
+import binascii
+import orjson
 
 from ..database import get_db
 from ..auth import get_current_user
 from ..models import ExecutionLogResponse
-from ..timezone_utils import format_datetime_for_api
+from ..timezone_utils import format_timestamp_for_api
+from ..utils import stream_json_array, stream_ndjson
 
 router = APIRouter()
 
+# Column order read by row_to_log
+LOG_COLUMNS = """el.id, el.script_id, el.trigger_id, el.started_at, el.finished_at,
+            el.duration_ms, el.status, el.exit_code, el.stdout, el.stderr,
+            el.max_memory_mb, el.max_cpu_percent, el.triggered_by"""
+
+def row_to_log(row) -> dict:
+    """Convert a LOG_COLUMNS row to the ExecutionLogResponse shape"""
+    return {
+        "id": row[0],
+        "script_id": row[1],
+        "trigger_id": row[2],
+        "started_at": format_timestamp_for_api(row[3]),
+        "finished_at": format_timestamp_for_api(row[4]),
+        "duration_ms": row[5],
+        "status": row[6],
+        "exit_code": row[7],
+        "stdout": row[8],
+        "stderr": row[9],
+        "max_memory_mb": row[10],
+        "max_cpu_percent": row[11],
+        "triggered_by": row[12]
+    }
+
+def encode_log_cursor(started_at: str, log_id: int) -> str:
+    """Opaque pagination cursor for the position after (started_at, id)"""
+    return base64.urlsafe_b64encode(orjson.dumps([started_at, log_id])).decode()
+
+def decode_log_cursor(value: str) -> tuple:
+    """Decode a cursor from encode_log_cursor"""
+    try:
+        started_at, log_id = orjson.loads(base64.urlsafe_b64decode(value))
+    except (binascii.Error, orjson.JSONDecodeError, TypeError, ValueError):
+        raise HTTPException(400, "Invalid cursor")
+    if not isinstance(started_at, str) or not isinstance(log_id, int):
+        raise HTTPException(400, "Invalid cursor")
+    return started_at, log_id
+
+LOG_ORDER = " ORDER BY el.started_at DESC, el.id DESC"
+
+def log_cursor_condition(page_cursor: Optional[str]) -> tuple:
+    """Keyset condition and params for a page cursor (an index range scan, independent of depth)"""
+    if not page_cursor:
+        return "", []
+    return " AND (el.started_at, el.id) < (?, ?)", list(decode_log_cursor(page_cursor))
+
+def paginate_logs(from_where: str, params: list, page_cursor: Optional[str], limit: int, offset: int,
+                  ndjson: bool = False, if_empty: Optional[Callable[[], None]] = None):
+    """Page of logs newest first. Offset paging streams the rows; keyset paging
+    (any cursor parameter, empty for the first page) sets X-Next-Cursor if more follow.
+    if_empty runs when the page has no rows, e.g. to 404 on a missing script"""
+    if page_cursor is None and if_empty is None:
+        stream = stream_ndjson if ndjson else stream_json_array
+        return stream(
+            f"SELECT {LOG_COLUMNS} {from_where}{LOG_ORDER} LIMIT ? OFFSET ?",
+            list(params) + [limit, offset],
+            transform=row_to_log
+        )
+    
+    if page_cursor is None:
+        # Read up front so an empty page can be checked before responding
+        query = f"SELECT {LOG_COLUMNS} {from_where}{LOG_ORDER} LIMIT ? OFFSET ?"
+        query_params = list(params) + [limit, offset]
+    else:
+        condition, cursor_params = log_cursor_condition(page_cursor)
+        limit = max(limit, 0)
+        # One row past the page tells whether another page follows
+        query = f"SELECT {LOG_COLUMNS} {from_where}{condition}{LOG_ORDER} LIMIT ?"
+        query_params = list(params) + cursor_params + [limit + 1]
+    
+    with get_db() as conn:
+        rows = conn.execute(query, query_params).fetchall()
+    
+    if not rows and if_empty:
+        if_empty()
+    
+    page_rows = rows if page_cursor is None else rows[:limit]
+    logs = [row_to_log(row) for row in page_rows]
+    if ndjson:
+        response = Response(
+            b"".join(orjson.dumps(log, option=orjson.OPT_APPEND_NEWLINE) for log in logs),
+            media_type="application/x-ndjson"
+        )
+    else:
+        response = ORJSONResponse(logs)
+    if page_cursor is not None and limit > 0 and len(rows) > limit:
+        page_end = rows[limit - 1]
+        response.headers["X-Next-Cursor"] = encode_log_cursor(page_end["started_at"], page_end["id"])
+    return response
+
 @router.get("/", response_model=List[ExecutionLogResponse])
 async def list_execution_logs(
     script_id: Optional[int] = None,
@@ -18,61 +111,40 @@ async def list_execution_logs(
     search: Optional[str] = None,
     limit: int = 100,
     offset: int = 0,
+    page_cursor: Optional[str] = Query(None, alias="cursor"),
+    output_format: str = Query("json", alias="format", pattern="^(json|ndjson)$"),
     current_user: dict = Depends(get_current_user)
 ):
-    """Get execution logs with optional filtering"""
-    with get_db() as conn:
-        query = """
-            SELECT el.*, s.name as script_name
-            FROM execution_logs el
-            JOIN scripts s ON el.script_id = s.id
-            WHERE 1=1
-        """
-        params = []
-        
-        if script_id:
-            query += " AND el.script_id = ?"
-            params.append(script_id)
-        
-        if status:
-            query += " AND el.status = ?"
-            params.append(status)
-        
-        if date_from:
-            query += " AND el.started_at >= ?"
-            params.append(date_from)
-        
-        if date_to:
-            query += " AND el.started_at <= ?"
-            params.append(date_to + " 23:59:59")  # Include full day
-        
-        if search:
-            query += " AND (s.name LIKE ? OR el.stdout LIKE ? OR el.stderr LIKE ?)"
-            search_term = f"%{search}%"
-            params.extend([search_term, search_term, search_term])
-        
-        query += " ORDER BY el.started_at DESC LIMIT ? OFFSET ?"
-        params.extend([limit, offset])
-        
-        cursor = conn.execute(query, params)
-        logs = []
-        for row in cursor.fetchall():
-            log_dict = dict(row)
-            log_dict.pop('script_name', None)  # Remove join field
-            
-            # Format datetime fields with proper UTC indicators
-            if log_dict.get('started_at'):
-                log_dict['started_at'] = format_datetime_for_api(
-                    datetime.fromisoformat(log_dict['started_at'])
-                )
-            if log_dict.get('finished_at'):
-                log_dict['finished_at'] = format_datetime_for_api(
-                    datetime.fromisoformat(log_dict['finished_at'])
-                )
-            
-            logs.append(ExecutionLogResponse(**log_dict))
-        
-        return logs
+    """Get execution logs with optional filtering (format=ndjson for large exports)"""
+    query = """
+        FROM execution_logs el
+        JOIN scripts s ON el.script_id = s.id
+        WHERE 1=1
+    """
+    params = []
+    
+    if script_id:
+        query += " AND el.script_id = ?"
+        params.append(script_id)
+    
+    if status:
+        query += " AND el.status = ?"
+        params.append(status)
+    
+    if date_from:
+        query += " AND el.started_at >= ?"
+        params.append(date_from)
+    
+    if date_to:
+        query += " AND el.started_at <= ?"
+        params.append(date_to + " 23:59:59")  # Include full day
+    
+    if search:
+        query += " AND (s.name LIKE ? OR el.stdout LIKE ? OR el.stderr LIKE ?)"
+        search_term = f"%{search}%"
+        params.extend([search_term, search_term, search_term])
+    
+    return paginate_logs(query, params, page_cursor, limit, offset, output_format == "ndjson")
 
 @router.get("/{log_id}", response_model=ExecutionLogResponse)
 async def get_execution_log(
@@ -81,56 +153,34 @@ async def get_execution_log(
 ):
     """Get specific execution log"""
     with get_db() as conn:
-        cursor = conn.execute("SELECT * FROM execution_logs WHERE id = ?", (log_id,))
+        cursor = conn.execute(f"SELECT {LOG_COLUMNS} FROM execution_logs el WHERE el.id = ?", (log_id,))
         log = cursor.fetchone()
         
         if not log:
             raise HTTPException(404, "Execution log not found")
         
-        log_dict = dict(log)
-        
-        # Format datetime fields with proper UTC indicators
-        if log_dict.get('started_at'):
-            log_dict['started_at'] = format_datetime_for_api(
-                datetime.fromisoformat(log_dict['started_at'])
-            )
-        if log_dict.get('finished_at'):
-            log_dict['finished_at'] = format_datetime_for_api(
-                datetime.fromisoformat(log_dict['finished_at'])
-            )
-        
-        return ExecutionLogResponse(**log_dict)
+        return ORJSONResponse(row_to_log(log))
 
 @router.get("/script/{safe_name}", response_model=List[ExecutionLogResponse])
 async def get_script_execution_logs(
     safe_name: str,
     limit: int = 50,
     offset: int = 0,
+    page_cursor: Optional[str] = Query(None, alias="cursor"),
     current_user: dict = Depends(get_current_user)
 ):
     """Get execution logs for a specific script"""
-    with get_db() as conn:
-        # Check if script exists and get script_id
-        cursor = conn.execute("SELECT id FROM scripts WHERE safe_name = ?", (safe_name,))
-        script = cursor.fetchone()
-        if not script:
-            raise HTTPException(404, "Script not found")
-        
-        script_id = script["id"]
-        
-        # Get logs
-        cursor = conn.execute("""
-            SELECT * FROM execution_logs 
-            WHERE script_id = ? 
-            ORDER BY started_at DESC 
-            LIMIT ? OFFSET ?
-        """, (script_id, limit, offset))
-        
-        logs = []
-        for row in cursor.fetchall():
-            logs.append(ExecutionLogResponse(**dict(row)))
-        
-        return logs
+    def ensure_script_exists():
+        # Only an empty page needs telling a missing script from one without logs
+        with get_db() as conn:
+            cursor = conn.execute("SELECT 1 FROM scripts WHERE safe_name = ?", (safe_name,))
+            if not cursor.fetchone():
+                raise HTTPException(404, "Script not found")
+    
+    return paginate_logs(
+        "FROM execution_logs el JOIN scripts s ON s.id = el.script_id WHERE s.safe_name = ?",
+        [safe_name], page_cursor, limit, offset, if_empty=ensure_script_exists
+    )
 
 @router.delete("/{log_id}")
 async def delete_execution_log(
@@ -153,20 +203,21 @@ async def delete_script_execution_logs(
 ):
     """Delete all execution logs for a script"""
     with get_db() as conn:
-        # Check if script exists and get script_id
-        cursor = conn.execute("SELECT id FROM scripts WHERE safe_name = ?", (safe_name,))
-        script = cursor.fetchone()
-        if not script:
-            raise HTTPException(404, "Script not found")
-        
-        script_id = script["id"]
+        cursor = conn.execute("""
+            DELETE FROM execution_logs
+            WHERE script_id = (SELECT id FROM scripts WHERE safe_name = ?)
+        """, (safe_name,))
+        deleted_count = cursor.rowcount
         
-        # Delete logs
-        cursor = conn.execute("DELETE FROM execution_logs WHERE script_id = ?", (script_id,))
+        # Nothing deleted: only then tell a missing script from one without logs
+        if deleted_count == 0:
+            cursor = conn.execute("SELECT 1 FROM scripts WHERE safe_name = ?", (safe_name,))
+            if not cursor.fetchone():
+                raise HTTPException(404, "Script not found")
         
         return {
             "success": True,
-            "message": f"Deleted {cursor.rowcount} execution logs for script"
+            "message": f"Deleted {deleted_count} execution logs for script"
         }
 
 @router.post("/cleanup")
@@ -178,14 +229,17 @@ async def cleanup_old_logs(
     if not current_user.get("is_admin"):
         raise HTTPException(403, "Admin access required")
     
-    days = cleanup_data.get("days", 30)
+    try:
+        days = int(cleanup_data.get("days", 30))
+    except (TypeError, ValueError):
+        raise HTTPException(400, "days must be an integer")
     
     with get_db() as conn:
         # Delete logs older than specified days
         cursor = conn.execute("""
             DELETE FROM execution_logs 
-            WHERE started_at < datetime('now', '-{} days')
-        """.format(days))
+            WHERE started_at < datetime('now', ?)
+        """, (f"-{days} days",))
         
         deleted_count = cursor.rowcount
         
@@ -205,16 +259,17 @@ async def get_execution_stats(
         query = """
             SELECT 
                 COUNT(*) as total_executions,
-                SUM(CASE WHEN status = 'success' THEN 1 ELSE 0 END) as successful_executions,
-                SUM(CASE WHEN status = 'failed' THEN 1 ELSE 0 END) as failed_executions,
-                AVG(duration_ms) as avg_duration_ms,
+                COALESCE(SUM(status = 'success'), 0) as successful_executions,
+                COALESCE(SUM(status = 'failed'), 0) as failed_executions,
+                COALESCE(SUM(status = 'success') * 100.0 / COUNT(*), 0.0) as success_rate,
+                COALESCE(AVG(duration_ms), 0) as avg_duration_ms,
                 MIN(started_at) as first_execution,
                 MAX(started_at) as last_execution
             FROM execution_logs
-            WHERE started_at > datetime('now', '-{} days')
-        """.format(days)
+            WHERE started_at > datetime('now', ?)
+        """
         
-        params = []
+        params = [f"-{int(days)} days"]
         if script_id:
             query += " AND script_id = ?"
             params.append(script_id)
@@ -223,11 +278,11 @@ async def get_execution_stats(
         stats = cursor.fetchone()
         
         return {
-            "total_executions": stats["total_executions"] or 0,
-            "successful_executions": stats["successful_executions"] or 0,
-            "failed_executions": stats["failed_executions"] or 0,
-            "success_rate": (stats["successful_executions"] or 0) / max(stats["total_executions"] or 1, 1) * 100,
-            "avg_duration_ms": stats["avg_duration_ms"] or 0,
+            "total_executions": stats["total_executions"],
+            "successful_executions": stats["successful_executions"],
+            "failed_executions": stats["failed_executions"],
+            "success_rate": stats["success_rate"],
+            "avg_duration_ms": stats["avg_duration_ms"],
             "first_execution": stats["first_execution"],
             "last_execution": stats["last_execution"],
             "days": days
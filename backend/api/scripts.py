@@ -1,25 +1,73 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import ORJSONResponse
 from typing import List, Optional
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 from datetime import datetime
+import asyncio
+import functools
 import json
+import os
+import threading
+import time
+import orjson
 
 from ..database import get_db
 from ..auth import get_current_user
 from ..models import ScriptCreate, ScriptUpdate, ScriptResponse, AutoSaveRequest
 from ..utils import generate_safe_name, ensure_unique_safe_name, get_folder_path
 from ..virtual_env import VirtualEnvironmentManager
-from ..timezone_utils import format_datetime_for_api
+from ..timezone_utils import format_datetime_for_api, format_timestamp_for_api
 
-def load_script_content_from_file(script_dict: dict) -> dict:
-    """Load script content from file (source of truth) and update database if needed"""
+# script file path -> (st_mtime_ns, st_size, content)
+_script_file_cache = {}
+_script_file_cache_lock = threading.Lock()
+
+def read_script_file(path: Path) -> Optional[str]:
+    """Read a script file, serving unchanged files (same mtime and size) from memory;
+    None if the file doesn't exist"""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        forget_script_file(path)
+        return None
+    
+    with _script_file_cache_lock:
+        cached = _script_file_cache.get(path)
+    if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+        return cached[2]
+    
+    content = path.read_text()
+    with _script_file_cache_lock:
+        _script_file_cache[path] = (stat.st_mtime_ns, stat.st_size, content)
+    return content
+
+def forget_script_file(path: Path):
+    """Drop a script file from the content cache after writing or removing it"""
+    with _script_file_cache_lock:
+        _script_file_cache.pop(path, None)
+
+@functools.lru_cache(maxsize=1024)
+def get_manager(safe_name: str, folder_path: str = "") -> VirtualEnvironmentManager:
+    """Shared VirtualEnvironmentManager for a script location (managers only hold paths)"""
+    return VirtualEnvironmentManager(safe_name, folder_path)
+
+def write_script_file(manager: VirtualEnvironmentManager, content: str):
+    """Write a script's file, creating its directory if needed (blocking)"""
+    manager.script_path.mkdir(parents=True, exist_ok=True)
+    manager.script_file.write_text(content)
+    forget_script_file(manager.script_file)
+
+def load_script_content_from_file(script_dict: dict, folder_path: str) -> dict:
+    """Load script content from file (source of truth) and update database if needed;
+    the update commits on its own connection, so this is safe to run in a worker thread"""
     try:
-        folder_path = get_folder_path(script_dict.get("folder_id"))
-        manager = VirtualEnvironmentManager(script_dict["safe_name"], folder_path)
+        manager = get_manager(script_dict["safe_name"], folder_path)
         
         # If script file exists, use it as source of truth
-        if manager.script_file.exists():
-            file_content = manager.script_file.read_text()
-            
+        file_content = read_script_file(manager.script_file)
+        if file_content is not None:
             # If file content differs from database, update database
             if file_content != script_dict.get("content", ""):
                 with get_db() as conn:
@@ -34,37 +82,300 @@ def load_script_content_from_file(script_dict: dict) -> dict:
         print(f"Error loading script content from file: {e}")
         return script_dict
 
+# Overlaps script file reads when loading many scripts at once
+_script_file_reader = ThreadPoolExecutor(max_workers=8, thread_name_prefix="script-files")
+
+def _read_script_file(script_dict: dict) -> Optional[str]:
+    """Read a script's file, or None if it doesn't exist or can't be read"""
+    manager = get_manager(script_dict["safe_name"], script_dict.pop("folder_name") or "")
+    try:
+        return read_script_file(manager.script_file)
+    except Exception as e:
+        print(f"Error loading script content from file: {e}")
+        return None
+
+def load_script_contents_bulk(script_dicts: list):
+    """Load content for many scripts (rows carrying folder_name) from their files,
+    syncing rows whose file changed with a single executemany on its own connection"""
+    file_contents = list(_script_file_reader.map(_read_script_file, script_dicts))
+    
+    changed = []
+    for script_dict, file_content in zip(script_dicts, file_contents):
+        if file_content is not None and file_content != script_dict["content"]:
+            script_dict["content"] = file_content
+            changed.append((file_content, script_dict["id"]))
+    
+    if changed:
+        with get_db() as conn:
+            # Take the write lock up front rather than upgrading a read transaction mid-way
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany(
+                "UPDATE scripts SET content = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+                changed
+            )
+
+def cleanup_script_environment(manager: VirtualEnvironmentManager):
+    """Remove a deleted script's directory and virtual environment"""
+    try:
+        manager.cleanup()
+    except Exception as e:
+        print(f"Error cleaning up virtual environment: {e}")
+
 router = APIRouter()
 
+VENV_INFO_TTL_SECONDS = 60
+
+# venv path -> (expires_at, venv stamp, response); pip list is slow and rarely changes
+_venv_info_cache = {}
+
+def invalidate_venv_info(manager: VirtualEnvironmentManager):
+    """Forget cached venv-info for a script's environment"""
+    _venv_info_cache.pop(str(manager.get_venv_path()), None)
+
+def get_venv_stamp(venv_path: Path):
+    """mtimes of pyvenv.cfg and site-packages; they change when the venv is rebuilt or pip installs"""
+    stamp = []
+    for path in [venv_path / "pyvenv.cfg", *venv_path.glob("lib/*/site-packages"), venv_path / "Lib" / "site-packages"]:
+        try:
+            stamp.append(path.stat().st_mtime_ns)
+        except OSError:
+            pass
+    return tuple(stamp)
+
+# Strong references to in-flight venv builds and installs so they aren't garbage collected
+_venv_tasks = set()
+
+def spawn_venv_task(coro) -> asyncio.Task:
+    """Run a venv coroutine in the background, keeping a reference until it finishes"""
+    task = asyncio.create_task(coro)
+    _venv_tasks.add(task)
+    task.add_done_callback(_venv_tasks.discard)
+    return task
+
+async def build_venv(manager: VirtualEnvironmentManager, python_version: str, requirements: str):
+    """Create a script's virtual environment and install its requirements; builds are
+    bounded by VENV_BUILD_CONCURRENCY inside VirtualEnvironmentManager"""
+    try:
+        await manager.create_environment(python_version)
+        if requirements:
+            await manager.install_requirements(requirements)
+    except Exception as e:
+        print(f"Background venv creation failed: {e}")
+    finally:
+        invalidate_venv_info(manager)
+
+REQUIREMENTS_DEBOUNCE_SECONDS = 2.0
+
+# venv path -> install task still inside its debounce window
+_debounced_installs = {}
+
+# venv path -> number of the newest scheduled install, and the lock that keeps
+# pip runs into one venv from overlapping
+_requirements_generations = {}
+_venv_install_locks = {}
+
+def schedule_requirements_install(manager: VirtualEnvironmentManager, requirements: str):
+    """Install requirements after a short delay, superseding an install for the same
+    venv that hasn't started yet, so rapid saves run pip once"""
+    key = str(manager.get_venv_path())
+    previous = _debounced_installs.pop(key, None)
+    if previous:
+        previous.cancel()
+    generation = _requirements_generations[key] = _requirements_generations.get(key, 0) + 1
+    _debounced_installs[key] = spawn_venv_task(install_venv_requirements(manager, requirements, generation))
+
+async def install_venv_requirements(manager: VirtualEnvironmentManager, requirements: str, generation: int):
+    """Install requirements into an existing virtual environment, one pip run per venv
+    at a time, skipping the install if a newer one was scheduled meanwhile"""
+    key = str(manager.get_venv_path())
+    await asyncio.sleep(REQUIREMENTS_DEBOUNCE_SECONDS)
+    if _debounced_installs.get(key) is asyncio.current_task():
+        del _debounced_installs[key]
+    
+    async with _venv_install_locks.setdefault(key, asyncio.Lock()):
+        if _requirements_generations.get(key) != generation:
+            return
+        try:
+            await manager.install_requirements(requirements)
+        except Exception as e:
+            print(f"Error updating script file or virtual environment: {e}")
+        finally:
+            invalidate_venv_info(manager)
+
+# The ScriptResponse columns
+SCRIPT_COLUMNS = """s.id, s.name, s.safe_name, s.description, s.content, s.folder_id,
+            s.python_version, s.requirements, s.enabled, s.created_at, s.updated_at,
+            s.last_executed_at, s.execution_count, s.success_count, s.email_notifications,
+            s.email_recipients, s.email_trigger_type, s.environment_variables, s.auto_save"""
+
+SCRIPT_DATETIME_FIELDS = ('created_at', 'updated_at', 'last_executed_at')
+SCRIPT_BOOL_FIELDS = ('enabled', 'email_notifications', 'auto_save')
+SCRIPT_RESPONSE_FIELDS = tuple(ScriptResponse.model_fields)
+
+def script_response(script_dict: dict) -> ORJSONResponse:
+    """Serialize a scripts row as a ScriptResponse without running Pydantic validation"""
+    payload = {field: script_dict[field] for field in SCRIPT_RESPONSE_FIELDS}
+    for field in SCRIPT_BOOL_FIELDS:
+        payload[field] = bool(payload[field])
+    return ORJSONResponse(payload)
+
+# ScriptUpdate fields written straight to the scripts column of the same name
+SCRIPT_UPDATE_FIELDS = (
+    'description', 'content', 'folder_id', 'python_version', 'requirements',
+    'email_notifications', 'email_recipients', 'email_trigger_type',
+    'environment_variables', 'auto_save', 'enabled'
+)
+
+@functools.lru_cache(maxsize=256)
+def update_script_sql(columns: tuple) -> str:
+    """UPDATE ... RETURNING * for a set of changed columns; the same field set always
+    yields the same string, so it also reuses the connection's prepared statement"""
+    assignments = ", ".join(f"{column} = ?" for column in columns)
+    return f"UPDATE scripts SET {assignments}, updated_at = CURRENT_TIMESTAMP WHERE id = ? RETURNING *"
+
+# Shared statement text, so every handler hits the same prepared statement
+_SQL_SCRIPT_BY_SAFE_NAME = "SELECT * FROM scripts WHERE safe_name = ?"
+_SQL_SCRIPT_REF_BY_SAFE_NAME = "SELECT id, name, safe_name, folder_id, enabled, auto_save FROM scripts WHERE safe_name = ?"
+_SQL_AUTO_SAVE_CONTENT = """
+    UPDATE scripts SET content = ?, updated_at = CURRENT_TIMESTAMP
+    WHERE id = ? AND auto_save = true
+"""
+
+AUTO_SAVE_FLUSH_SECONDS = 0.5
+
+# script id -> (safe_name, folder_id, content); only the newest content per
+# script is kept until the next flush, so bursts of keystrokes cost one write
+_pending_auto_saves = {}
+
+# Held while buffered auto-saves are written and while update_script saves, so
+# a flush taken before an explicit save can't land after it and overwrite it
+auto_save_write_lock = asyncio.Lock()
+
+SCRIPT_REF_TTL_SECONDS = 5.0
+SCRIPT_REF_CACHE_SIZE = 512
+
+# safe_name -> (expires_at, id/name/folder/flags dict) for the execute, auto-save and venv-info lookups
+_script_ref_cache = {}
+
+def get_script_ref(safe_name: str) -> Optional[dict]:
+    """Look up a script's id, name, folder and flags by safe_name, cached briefly"""
+    now = time.monotonic()
+    cached = _script_ref_cache.get(safe_name)
+    if cached and cached[0] > now:
+        return cached[1]
+    
+    with get_db() as conn:
+        row = conn.execute(_SQL_SCRIPT_REF_BY_SAFE_NAME, (safe_name,)).fetchone()
+    if not row:
+        _script_ref_cache.pop(safe_name, None)
+        return None
+    
+    if len(_script_ref_cache) >= SCRIPT_REF_CACHE_SIZE:
+        _script_ref_cache.pop(next(iter(_script_ref_cache)))
+    script = dict(row)
+    _script_ref_cache[safe_name] = (now + SCRIPT_REF_TTL_SECONDS, script)
+    return script
+
+def forget_script_ref(*safe_names: str):
+    """Drop cached lookups after a script is renamed, updated or deleted"""
+    for safe_name in safe_names:
+        _script_ref_cache.pop(safe_name, None)
+
+def take_pending_auto_saves() -> dict:
+    """Remove and return buffered auto-saves (call from the event loop)"""
+    pending = dict(_pending_auto_saves)
+    _pending_auto_saves.clear()
+    return pending
+
+def write_auto_saves(pending: dict):
+    """Write buffered auto-save content to the database and script files"""
+    if not pending:
+        return
+    
+    with get_db() as conn:
+        conn.executemany(_SQL_AUTO_SAVE_CONTENT, [
+            (content, script_id) for script_id, (_, _, content) in pending.items()
+        ])
+        folder_paths = {folder_id: get_folder_path(folder_id, conn) for _, folder_id, _ in pending.values()}
+    
+    for safe_name, folder_id, content in pending.values():
+        try:
+            manager = get_manager(safe_name, folder_paths[folder_id])
+            manager.script_file.write_text(content)
+            forget_script_file(manager.script_file)
+        except Exception as e:
+            print(f"Error updating script file during auto-save: {e}")
+
+async def write_pending_auto_saves(pending: dict):
+    """Write taken auto-saves in the threadpool; on failure put them back, behind
+    any newer content buffered meanwhile, and re-raise (hold auto_save_write_lock)"""
+    try:
+        await run_in_threadpool(write_auto_saves, pending)
+    except Exception:
+        for script_id, entry in pending.items():
+            _pending_auto_saves.setdefault(script_id, entry)
+        raise
+
+async def flush_auto_save(script_id: int):
+    """Write one script's buffered auto-save now, e.g. before it is executed"""
+    async with auto_save_write_lock:
+        pending = _pending_auto_saves.pop(script_id, None)
+        if pending:
+            await write_pending_auto_saves({script_id: pending})
+
+async def run_auto_save_flusher():
+    """Flush buffered auto-saves every AUTO_SAVE_FLUSH_SECONDS until cancelled"""
+    while True:
+        await asyncio.sleep(AUTO_SAVE_FLUSH_SECONDS)
+        if not _pending_auto_saves:
+            continue
+        async with auto_save_write_lock:
+            try:
+                await write_pending_auto_saves(take_pending_auto_saves())
+            except Exception as e:
+                print(f"Error flushing auto-saves: {e}")
+
 @router.get("/", response_model=List[ScriptResponse])
 @router.get("", response_model=List[ScriptResponse])
 async def list_scripts(current_user: dict = Depends(get_current_user)):
     """Get all scripts with folder information"""
     with get_db() as conn:
-        cursor = conn.execute("""
-            SELECT s.*, f.name as folder_name 
-            FROM scripts s 
-            LEFT JOIN folders f ON s.folder_id = f.id
-            ORDER BY f.name NULLS FIRST, s.name
+        # Plain tuples zipped with the column names skip building a sqlite3.Row per script
+        cursor = conn.cursor()
+        cursor.row_factory = None
+        
+        # Unfiled scripts first, then by folder; both read in index order
+        # (idx_scripts_folder_name, idx_folders_name) with no sort step
+        cursor.execute(f"""
+            SELECT {SCRIPT_COLUMNS}, NULL as folder_name
+            FROM scripts s
+            WHERE s.folder_id IS NULL
+            ORDER BY s.name
         """)
-        scripts = []
-        for row in cursor.fetchall():
-            script_dict = dict(row)
-            script_dict.pop('folder_name', None)  # Remove join field
-            
-            # Load content from file (source of truth)
-            script_dict = load_script_content_from_file(script_dict)
-            
-            # Format datetime fields for API response
-            datetime_fields = ['created_at', 'updated_at', 'last_executed_at']
-            for field in datetime_fields:
-                if script_dict.get(field):
-                    # Parse SQLite datetime string and format for API
-                    dt = datetime.fromisoformat(script_dict[field].replace('Z', '+00:00'))
-                    script_dict[field] = format_datetime_for_api(dt)
-            
-            scripts.append(ScriptResponse(**script_dict))
-        return scripts
+        rows = cursor.fetchall()
+        cursor.execute(f"""
+            SELECT {SCRIPT_COLUMNS}, f.name as folder_name
+            FROM folders f
+            JOIN scripts s ON s.folder_id = f.id
+            ORDER BY f.name, f.id, s.name
+        """)
+        rows += cursor.fetchall()
+        
+        columns = [description[0] for description in cursor.description]
+        scripts = [dict(zip(columns, row)) for row in rows]
+    
+    # Load content from files (source of truth), off the event loop and
+    # outside the read above, so no transaction stays open across the await
+    await asyncio.to_thread(load_script_contents_bulk, scripts)
+    
+    for script_dict in scripts:
+        # Format datetime fields for API response
+        for field in SCRIPT_DATETIME_FIELDS:
+            script_dict[field] = format_timestamp_for_api(script_dict[field])
+        for field in SCRIPT_BOOL_FIELDS:
+            script_dict[field] = bool(script_dict[field])
+    
+    return ORJSONResponse(scripts)
 
 @router.post("/", response_model=ScriptResponse)
 @router.post("", response_model=ScriptResponse)
@@ -93,6 +404,7 @@ async def create_script(
                 requirements, email_notifications, email_recipients, email_trigger_type,
                 environment_variables, auto_save
             ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            RETURNING *
         """, (
             script.name, safe_name, script.description, script.content, script.folder_id,
             script.python_version, script.requirements,
@@ -100,39 +412,30 @@ async def create_script(
             script.environment_variables, script.auto_save
         ))
         
-        script_id = cursor.lastrowid
+        created_script = cursor.fetchone()
+        folder_path = get_folder_path(script.folder_id, conn)
+    
+    # Create script file immediately (source of truth), once the row is
+    # committed so the write transaction is not held across the await
+    try:
+        manager = get_manager(safe_name, folder_path)
         
-        # Create script file immediately (source of truth)
-        try:
-            folder_path = get_folder_path(script.folder_id)
-            manager = VirtualEnvironmentManager(safe_name, folder_path)
-            
-            # Create directory and script file first
-            manager.script_path.mkdir(parents=True, exist_ok=True)
-            manager.script_file.write_text(script.content)
-            
-            # Create virtual environment in background (don't wait for it)
-            # This prevents the UI from hanging
-            async def create_venv_background():
-                try:
-                    await manager.create_environment(script.python_version)
-                    if script.requirements:
-                        await manager.install_requirements(script.requirements)
-                except Exception as e:
-                    print(f"Background venv creation failed: {e}")
-            
-            import asyncio
-            asyncio.create_task(create_venv_background())
-            
-        except Exception as e:
-            print(f"Error creating script file: {e}")
-            raise HTTPException(500, f"Failed to create script file: {str(e)}")
+        # Create directory and script file first
+        await asyncio.to_thread(write_script_file, manager, script.content)
         
-        # Return created script with file content
-        cursor = conn.execute("SELECT * FROM scripts WHERE id = ?", (script_id,))
-        created_script = cursor.fetchone()
-        script_dict = load_script_content_from_file(dict(created_script))
-        return ScriptResponse(**script_dict)
+        # Create virtual environment in background (don't wait for it)
+        # This prevents the UI from hanging
+        spawn_venv_task(build_venv(manager, script.python_version, script.requirements))
+        
+    except Exception as e:
+        print(f"Error creating script file: {e}")
+        # Don't leave a script row behind without its file
+        with get_db() as conn:
+            conn.execute("DELETE FROM scripts WHERE id = ?", (created_script["id"],))
+        raise HTTPException(500, f"Failed to create script file: {str(e)}")
+    
+    # The file was just written from the same content as the row
+    return script_response(dict(created_script))
 
 @router.get("/{safe_name}", response_model=ScriptResponse)
 async def get_script(
@@ -141,16 +444,21 @@ async def get_script(
 ):
     """Get script by safe name"""
     with get_db() as conn:
-        cursor = conn.execute("SELECT * FROM scripts WHERE safe_name = ?", (safe_name,))
+        cursor = conn.execute(_SQL_SCRIPT_BY_SAFE_NAME, (safe_name,))
         script = cursor.fetchone()
         
         if not script:
             raise HTTPException(404, "Script not found")
         
-        # Load content from file (source of truth)
-        script_dict = load_script_content_from_file(dict(script))
-        
-        return ScriptResponse(**script_dict)
+        folder_path = get_folder_path(script["folder_id"], conn)
+    
+    # Load content from file (source of truth), unless an auto-save is still buffered
+    script_dict = await asyncio.to_thread(load_script_content_from_file, dict(script), folder_path)
+    pending = _pending_auto_saves.get(script_dict["id"])
+    if pending:
+        script_dict["content"] = pending[2]
+    
+    return script_response(script_dict)
 
 @router.put("/{safe_name}", response_model=ScriptResponse)
 async def update_script(
@@ -159,95 +467,61 @@ async def update_script(
     current_user: dict = Depends(get_current_user)
 ):
     """Update existing script"""
-    with get_db() as conn:
-        # Get existing script
-        cursor = conn.execute("SELECT * FROM scripts WHERE safe_name = ?", (safe_name,))
-        existing_script = cursor.fetchone()
-        
-        if not existing_script:
-            raise HTTPException(404, "Script not found")
-        
-        # Build update query
-        updates = []
-        params = []
-        
-        # Handle name change - update safe_name if needed
-        if script.name is not None and script.name != existing_script["name"]:
-            new_safe_name = generate_safe_name(script.name)
-            new_safe_name = ensure_unique_safe_name(new_safe_name, existing_script["folder_id"], existing_script["id"])
-            updates.extend(["name = ?", "safe_name = ?"])
-            params.extend([script.name, new_safe_name])
-        
-        # Add other fields
-        if script.description is not None:
-            updates.append("description = ?")
-            params.append(script.description)
-        
-        if script.content is not None:
-            updates.append("content = ?")
-            params.append(script.content)
-        
-        if script.folder_id is not None:
-            updates.append("folder_id = ?")
-            params.append(script.folder_id)
-        
-        if script.python_version is not None:
-            updates.append("python_version = ?")
-            params.append(script.python_version)
-        
-        if script.requirements is not None:
-            updates.append("requirements = ?")
-            params.append(script.requirements)
-        
-        if script.email_notifications is not None:
-            updates.append("email_notifications = ?")
-            params.append(script.email_notifications)
-        
-        if script.email_recipients is not None:
-            updates.append("email_recipients = ?")
-            params.append(script.email_recipients)
-        
-        if script.email_trigger_type is not None:
-            updates.append("email_trigger_type = ?")
-            params.append(script.email_trigger_type)
-        
-        if script.environment_variables is not None:
-            updates.append("environment_variables = ?")
-            params.append(script.environment_variables)
-        
-        if script.auto_save is not None:
-            updates.append("auto_save = ?")
-            params.append(script.auto_save)
-        
-        if script.enabled is not None:
-            updates.append("enabled = ?")
-            params.append(script.enabled)
-        
-        if updates:
-            updates.append("updated_at = CURRENT_TIMESTAMP")
-            query = f"UPDATE scripts SET {', '.join(updates)} WHERE id = ?"
-            params.append(existing_script["id"])
-            conn.execute(query, params)
+    async with auto_save_write_lock:
+        with get_db() as conn:
+            # Get existing script
+            cursor = conn.execute(_SQL_SCRIPT_BY_SAFE_NAME, (safe_name,))
+            existing_script = cursor.fetchone()
+            
+            if not existing_script:
+                raise HTTPException(404, "Script not found")
+            
+            # An explicit save supersedes any buffered auto-save
+            _pending_auto_saves.pop(existing_script["id"], None)
+            
+            # Build update query
+            columns = []
+            params = []
+            
+            # Handle name change - update safe_name if needed
+            if script.name is not None and script.name != existing_script["name"]:
+                new_safe_name = generate_safe_name(script.name)
+                new_safe_name = ensure_unique_safe_name(new_safe_name, existing_script["folder_id"], existing_script["id"], conn)
+                columns.extend(["name", "safe_name"])
+                params.extend([script.name, new_safe_name])
+            
+            # Add other fields
+            for field in SCRIPT_UPDATE_FIELDS:
+                value = getattr(script, field)
+                if value is not None:
+                    columns.append(field)
+                    params.append(value)
+            
+            folder_path = get_folder_path(existing_script["folder_id"], conn)
+            manager = get_manager(existing_script["safe_name"], folder_path)
+            
+            updated_script = existing_script
+            if columns:
+                params.append(existing_script["id"])
+                cursor = conn.execute(update_script_sql(tuple(columns)), params)
+                updated_script = cursor.fetchone()
         
-        # Update script file and virtual environment if needed
-        folder_path = get_folder_path(existing_script["folder_id"])
-        manager = VirtualEnvironmentManager(existing_script["safe_name"], folder_path)
+        # Committed; cached lookups must not outlive the old enabled/auto_save/name values
+        forget_script_ref(safe_name)
         
+        # Update script file if content changed, off the event loop now that the UPDATE is committed
         try:
-            # Update script file if content changed
             if script.content is not None:
-                manager.script_file.write_text(script.content)
-            
-            # Update virtual environment if requirements changed
-            if script.requirements is not None and script.requirements:
-                await manager.install_requirements(script.requirements)
+                await asyncio.to_thread(write_script_file, manager, script.content)
         except Exception as e:
             print(f"Error updating script file or virtual environment: {e}")
-        
-        # Return updated script
-        cursor = conn.execute("SELECT * FROM scripts WHERE id = ?", (existing_script["id"],))
-        updated_script = cursor.fetchone()
-        return ScriptResponse(**dict(updated_script))
+    
+    # Update virtual environment if requirements changed, after responding
+    if script.requirements and script.requirements != existing_script["requirements"]:
+        schedule_requirements_install(manager, script.requirements)
+    
+    # Return updated script
+    return script_response(dict(updated_script))
 
 @router.patch("/{safe_name}/auto-save")
 async def auto_save_script(
@@ -256,84 +530,133 @@ async def auto_save_script(
     current_user: dict = Depends(get_current_user)
 ):
     """Auto-save script content (for real-time saving)"""
-    with get_db() as conn:
-        # Get script info first
-        cursor = conn.execute("SELECT * FROM scripts WHERE safe_name = ? AND auto_save = true", (safe_name,))
-        script = cursor.fetchone()
-        
-        if not script:
-            raise HTTPException(404, "Script not found or auto-save disabled")
-        
-        # Update database
-        cursor = conn.execute("""
-            UPDATE scripts SET 
-                content = ?,
-                updated_at = CURRENT_TIMESTAMP
-            WHERE safe_name = ? AND auto_save = true
-        """, (auto_save_data.content, safe_name))
-        
-        # Update script file
-        try:
-            folder_path = get_folder_path(script["folder_id"])
-            manager = VirtualEnvironmentManager(safe_name, folder_path)
-            manager.script_file.write_text(auto_save_data.content)
-        except Exception as e:
-            print(f"Error updating script file during auto-save: {e}")
-        
-        return {"success": True, "saved_at": format_datetime_for_api(datetime.now())}
+    script = get_script_ref(safe_name)
+    
+    if not script or not script["auto_save"]:
+        raise HTTPException(404, "Script not found or auto-save disabled")
+    
+    # Buffered; run_auto_save_flusher writes the database and script file
+    _pending_auto_saves[script["id"]] = (script["safe_name"], script["folder_id"], auto_save_data.content)
+    
+    return {"success": True, "saved_at": format_datetime_for_api(datetime.now())}
+
+async def wait_for_task(task, timeout: float):
+    """Poll a Celery result with backoff until it is ready, then return it"""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    delay = 0.05
+    while not await run_in_threadpool(task.ready):
+        if loop.time() >= deadline:
+            raise TimeoutError(f"Task {task.id} did not finish within {timeout:g}s")
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, 1.0)
+    return await run_in_threadpool(task.get, timeout=1)
+
+# Async Redis client for result pub/sub, created on first use inside the event loop
+_result_redis = None
+
+async def wait_for_task_result(task, timeout: float):
+    """Wait for a Celery result by subscribing to the Redis backend's
+    celery-task-meta-<id> channel; polls with wait_for_task on other backends"""
+    global _result_redis
+    from celery import states
+    from celery.backends.redis import RedisBackend
+    from redis import asyncio as aioredis
+    
+    backend = task.backend
+    if not isinstance(backend, RedisBackend):
+        return await wait_for_task(task, timeout)
+    
+    key = backend.get_key_for_task(task.id)
+    try:
+        if _result_redis is None:
+            _result_redis = aioredis.from_url(task.app.conf.result_backend)
+        pubsub = _result_redis.pubsub()
+        await pubsub.subscribe(key)
+    except (aioredis.RedisError, OSError) as e:
+        print(f"Result subscription unavailable, polling instead: {e}")
+        return await wait_for_task(task, timeout)
+    
+    async def receive():
+        # The result may have been stored before the subscription took effect
+        payload = await _result_redis.get(key)
+        meta = backend.decode_result(payload) if payload else None
+        while meta is None or meta["status"] not in states.READY_STATES:
+            message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+            if message:
+                meta = backend.decode_result(message["data"])
+        return meta
+    
+    try:
+        meta = await asyncio.wait_for(receive(), timeout)
+    except asyncio.TimeoutError:
+        raise TimeoutError(f"Task {task.id} did not finish within {timeout:g}s")
+    finally:
+        await pubsub.reset()
+    
+    if meta["status"] != states.SUCCESS:
+        raise backend.exception_to_python(meta["result"])
+    return meta["result"]
 
 @router.post("/{safe_name}/execute")
 async def execute_script(
     safe_name: str,
+    wait: bool = True,
     current_user: dict = Depends(get_current_user)
 ):
     """Execute script manually"""
-    with get_db() as conn:
-        cursor = conn.execute("""
-            SELECT * FROM scripts WHERE safe_name = ? AND enabled = true
-        """, (safe_name,))
-        script = cursor.fetchone()
-        
-        if not script:
-            raise HTTPException(404, "Script not found or disabled")
-        
-        # Queue script execution through Celery and wait for result
-        from ..tasks import execute_script_task
-        task = execute_script_task.delay(script["id"], None, "manual")
+    script = get_script_ref(safe_name)
+    
+    if not script or not script["enabled"]:
+        raise HTTPException(404, "Script not found or disabled")
+    await flush_auto_save(script["id"])
+    
+    # Queue script execution through Celery
+    from ..tasks import execute_script_task
+    task = execute_script_task.delay(script["id"], None, "manual")
+    
+    if not wait:
+        return {
+            "success": True,
+            "task_id": task.id,
+            "script": script["name"],
+            "message": f"Script '{script['name']}' queued for execution"
+        }
+    
+    # Wait for task completion (with timeout) without holding the event loop,
+    # a threadpool thread or the database connection meanwhile
+    try:
+        result = await wait_for_task_result(task, timeout=60)  # Wait up to 60 seconds
         
-        # Wait for task completion (with timeout)
-        try:
-            result = task.get(timeout=60)  # Wait up to 60 seconds
-            
-            if "error" in result:
-                return {
-                    "success": False,
-                    "error": result["error"],
-                    "exit_code": -1,
-                    "duration_ms": 0,
-                    "stdout": "",
-                    "stderr": result["error"]
-                }
-            
-            # Return the task result directly (now includes stdout/stderr)
-            return {
-                "success": result["status"] == "success",
-                "status": result["status"],
-                "exit_code": result["exit_code"],
-                "duration_ms": result["duration_ms"],
-                "stdout": result.get("stdout", ""),
-                "stderr": result.get("stderr", "")
-            }
-            
-        except Exception as e:
+        if "error" in result:
             return {
                 "success": False,
-                "error": f"Execution timeout or error: {str(e)}",
+                "error": result["error"],
                 "exit_code": -1,
                 "duration_ms": 0,
                 "stdout": "",
-                "stderr": str(e)
+                "stderr": result["error"]
             }
+        
+        # Return the task result directly (now includes stdout/stderr)
+        return {
+            "success": result["status"] == "success",
+            "status": result["status"],
+            "exit_code": result["exit_code"],
+            "duration_ms": result["duration_ms"],
+            "stdout": result.get("stdout", ""),
+            "stderr": result.get("stderr", "")
+        }
+        
+    except Exception as e:
+        return {
+            "success": False,
+            "error": f"Execution timeout or error: {str(e)}",
+            "exit_code": -1,
+            "duration_ms": 0,
+            "stdout": "",
+            "stderr": str(e)
+        }
 
 @router.get("/{safe_name}/trigger")
 async def trigger_script_via_url(
@@ -343,59 +666,58 @@ async def trigger_script_via_url(
     """Execute script via URL trigger (with optional API key)"""
     # Check API key if provided
     if api_key:
-        from .settings import load_settings
-        settings = load_settings()
-        stored_key = settings.get("app_settings", {}).get("api_key")
+        from .settings import load_api_key
+        stored_key = load_api_key()
         if not stored_key or stored_key != api_key:
             raise HTTPException(401, "Invalid API key")
     
     # Find and execute script
-    with get_db() as conn:
-        cursor = conn.execute("""
-            SELECT * FROM scripts WHERE safe_name = ? AND enabled = true
-        """, (safe_name,))
-        script = cursor.fetchone()
-        
-        if not script:
-            raise HTTPException(404, "Script not found or disabled")
-        
-        # Queue script execution through Celery
-        from ..tasks import execute_script_task
-        task = execute_script_task.delay(script["id"], None, "url")
-        
-        return {
-            "success": True,
-            "task_id": task.id,
-            "script": script["name"],
-            "message": f"Script '{script['name']}' queued for execution"
-        }
+    script = get_script_ref(safe_name)
+    
+    if not script or not script["enabled"]:
+        raise HTTPException(404, "Script not found or disabled")
+    
+    # Queue script execution through Celery
+    from ..tasks import execute_script_task
+    await flush_auto_save(script["id"])
+    task = execute_script_task.delay(script["id"], None, "url")
+    
+    return {
+        "success": True,
+        "task_id": task.id,
+        "script": script["name"],
+        "message": f"Script '{script['name']}' queued for execution"
+    }
 
 @router.delete("/{safe_name}")
 async def delete_script(
     safe_name: str,
+    background_tasks: BackgroundTasks,
     current_user: dict = Depends(get_current_user)
 ):
     """Delete script and clean up virtual environment"""
     with get_db() as conn:
-        cursor = conn.execute("SELECT * FROM scripts WHERE safe_name = ?", (safe_name,))
+        # Triggers and execution logs go with it via ON DELETE CASCADE
+        cursor = conn.execute("""
+            DELETE FROM scripts
+            WHERE id = (SELECT id FROM scripts WHERE safe_name = ? LIMIT 1)
+            RETURNING id, safe_name, folder_id
+        """, (safe_name,))
         script = cursor.fetchone()
-        
-        if not script:
-            raise HTTPException(404, "Script not found")
-        
-        # Clean up virtual environment
-        folder_path = get_folder_path(script["folder_id"])
-        manager = VirtualEnvironmentManager(script["safe_name"], folder_path)
-        
-        try:
-            manager.cleanup()
-        except Exception as e:
-            print(f"Error cleaning up virtual environment: {e}")
-        
-        # Delete script from database
-        cursor = conn.execute("DELETE FROM scripts WHERE id = ?", (script["id"],))
-        
-        return {"success": True, "message": "Script deleted successfully"}
+    
+    if not script:
+        raise HTTPException(404, "Script not found")
+    _pending_auto_saves.pop(script["id"], None)
+    forget_script_ref(safe_name)
+    
+    # Clean up virtual environment after the response is sent
+    folder_path = get_folder_path(script["folder_id"])
+    manager = get_manager(script["safe_name"], folder_path)
+    invalidate_venv_info(manager)
+    forget_script_file(manager.script_file)
+    background_tasks.add_task(cleanup_script_environment, manager)
+    
+    return {"success": True, "message": "Script deleted successfully"}
 
 @router.get("/{safe_name}/venv-info")
 async def get_venv_info(
@@ -403,104 +725,106 @@ async def get_venv_info(
     current_user: dict = Depends(get_current_user)
 ):
     """Get virtual environment information for a script"""
-    with get_db() as conn:
-        cursor = conn.execute("SELECT * FROM scripts WHERE safe_name = ?", (safe_name,))
-        script = cursor.fetchone()
-        
-        if not script:
-            raise HTTPException(404, "Script not found")
+    script = get_script_ref(safe_name)
+    
+    if not script:
+        raise HTTPException(404, "Script not found")
+    
+    # Get virtual environment manager
+    folder_path = get_folder_path(script["folder_id"])
+    manager = get_manager(script["safe_name"], folder_path)
+    
+    try:
+        # Check if venv exists
+        venv_exists = manager.exists()
         
-        # Get virtual environment manager
-        folder_path = get_folder_path(script["folder_id"])
-        manager = VirtualEnvironmentManager(script["safe_name"], folder_path)
+        if not venv_exists:
+            return {
+                "venv_exists": False,
+                "packages": [],
+                "python_version": None,
+                "venv_path": str(manager.get_venv_path()),
+                "message": "Virtual environment not created"
+            }
         
-        try:
-            # Check if venv exists
-            venv_exists = manager.exists()
+        # Serve from cache unless expired or packages changed, including installs by the worker
+        venv_key = str(manager.get_venv_path())
+        venv_stamp = await asyncio.to_thread(get_venv_stamp, manager.get_venv_path())
+        cached = _venv_info_cache.get(venv_key)
+        if cached and cached[0] > time.monotonic() and cached[1] == venv_stamp:
+            return cached[2]
+        
+        # Get installed packages
+        async def run_venv_command(*args, timeout: float):
+            """Run a venv executable, returning stdout bytes or None on failure"""
+            process = await asyncio.create_subprocess_exec(
+                *args,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.DEVNULL
+            )
+            try:
+                stdout, _ = await asyncio.wait_for(process.communicate(), timeout=timeout)
+            except asyncio.TimeoutError:
+                process.kill()
+                await process.wait()
+                raise
+            return stdout if process.returncode == 0 else None
+        
+        async def get_pip_list():
+            pip_path = manager.get_venv_path() / "bin" / "pip"
+            if not pip_path.exists():
+                pip_path = manager.get_venv_path() / "Scripts" / "pip.exe"  # Windows
             
-            if not venv_exists:
-                return {
-                    "venv_exists": False,
-                    "packages": [],
-                    "python_version": None,
-                    "venv_path": str(manager.get_venv_path()),
-                    "message": "Virtual environment not created"
-                }
+            if not pip_path.exists():
+                return []
             
-            # Get installed packages
-            import asyncio
-            from concurrent.futures import ThreadPoolExecutor
+            try:
+                stdout = await run_venv_command(str(pip_path), "list", "--format=json",
+                    "--disable-pip-version-check", "--no-python-version-warning", timeout=10)
+                if stdout is not None:
+                    return orjson.loads(stdout)
+                return []
+            except Exception as e:
+                print(f"Error getting pip list: {e}")
+                return []
+        
+        async def get_python_version():
+            python_path = manager.get_venv_path() / "bin" / "python"
+            if not python_path.exists():
+                python_path = manager.get_venv_path() / "Scripts" / "python.exe"  # Windows
             
-            def get_pip_list():
-                import subprocess
-                pip_path = manager.get_venv_path() / "bin" / "pip"
-                if not pip_path.exists():
-                    pip_path = manager.get_venv_path() / "Scripts" / "pip.exe"  # Windows
-                
-                if not pip_path.exists():
-                    return []
-                
-                try:
-                    result = subprocess.run(
-                        [str(pip_path), "list", "--format=json"],
-                        capture_output=True,
-                        text=True,
-                        timeout=10
-                    )
-                    if result.returncode == 0:
-                        import json
-                        return json.loads(result.stdout)
-                    return []
-                except Exception as e:
-                    print(f"Error getting pip list: {e}")
-                    return []
-            
-            def get_python_version():
-                import subprocess
-                python_path = manager.get_venv_path() / "bin" / "python"
-                if not python_path.exists():
-                    python_path = manager.get_venv_path() / "Scripts" / "python.exe"  # Windows
-                
-                if not python_path.exists():
-                    return "Unknown"
-                
-                try:
-                    result = subprocess.run(
-                        [str(python_path), "--version"],
-                        capture_output=True,
-                        text=True,
-                        timeout=5
-                    )
-                    if result.returncode == 0:
-                        return result.stdout.strip()
-                    return "Unknown"
-                except Exception as e:
-                    print(f"Error getting Python version: {e}")
-                    return "Unknown"
+            if not python_path.exists():
+                return "Unknown"
             
-            # Run in thread pool to avoid blocking
-            with ThreadPoolExecutor() as executor:
-                packages_future = executor.submit(get_pip_list)
-                version_future = executor.submit(get_python_version)
-                
-                packages = packages_future.result()
-                python_version = version_future.result()
-            
-            return {
-                "venv_exists": True,
-                "packages": packages,
-                "python_version": python_version,
-                "venv_path": str(manager.get_venv_path()),
-                "package_count": len(packages),
-                "message": "Virtual environment is ready"
-            }
-            
-        except Exception as e:
-            return {
-                "venv_exists": venv_exists,
-                "packages": [],
-                "python_version": None,
-                "venv_path": str(manager.get_venv_path()),
-                "error": str(e),
-                "message": "Error getting virtual environment info"
-            }
\ No newline at end of file
+            try:
+                stdout = await run_venv_command(str(python_path), "--version", timeout=5)
+                if stdout is not None:
+                    return stdout.decode().strip()
+                return "Unknown"
+            except Exception as e:
+                print(f"Error getting Python version: {e}")
+                return "Unknown"
+        
+        # Both subprocesses run concurrently on the event loop
+        packages, python_version = await asyncio.gather(get_pip_list(), get_python_version())
+        
+        venv_info = {
+            "venv_exists": True,
+            "packages": packages,
+            "python_version": python_version,
+            "venv_path": str(manager.get_venv_path()),
+            "package_count": len(packages),
+            "message": "Virtual environment is ready"
+        }
+        _venv_info_cache[venv_key] = (time.monotonic() + VENV_INFO_TTL_SECONDS, venv_stamp, venv_info)
+        return venv_info
+        
+    except Exception as e:
+        return {
+            "venv_exists": venv_exists,
+            "packages": [],
+            "python_version": None,
+            "venv_path": str(manager.get_venv_path()),
+            "error": str(e),
+            "message": "Error getting virtual environment info"
+        }
\ No newline at end of file
@@ -1,12 +1,14 @@
 from fastapi import APIRouter, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from typing import Optional, Dict, Any
 import os
-import json
 import secrets
+import threading
 from pathlib import Path
+import orjson
 
-from ..email_service import EmailService, test_email_connection
+from ..email_service import EmailService, email_service, test_email_connection
 
 router = APIRouter()
 
@@ -28,12 +30,28 @@ class AppSettings(BaseModel):
 # Settings file path
 SETTINGS_FILE = Path(os.getenv("TEMPO_DATA_PATH", "/data")) / "settings.json"
 
+# Parsed settings.json, reused until the file's mtime changes.
+# Callers must not mutate the returned dict.
+_settings_cache = {"mtime_ns": None, "data": None}
+_settings_cache_lock = threading.Lock()
+
 def load_settings() -> Dict[str, Any]:
-    """Load settings from file"""
-    if SETTINGS_FILE.exists():
+    """Load settings from file (cached until the file changes)"""
+    try:
+        mtime_ns = os.stat(SETTINGS_FILE).st_mtime_ns
+    except FileNotFoundError:
+        mtime_ns = None
+    
+    if mtime_ns is not None:
+        with _settings_cache_lock:
+            if _settings_cache["mtime_ns"] == mtime_ns:
+                return _settings_cache["data"]
         try:
-            with open(SETTINGS_FILE, 'r') as f:
-                return json.load(f)
+            data = orjson.loads(SETTINGS_FILE.read_bytes())
+            with _settings_cache_lock:
+                _settings_cache["mtime_ns"] = mtime_ns
+                _settings_cache["data"] = data
+            return data
         except Exception as e:
             print(f"Error loading settings: {e}")
     
@@ -56,14 +74,24 @@ def load_settings() -> Dict[str, Any]:
         }
     }
 
+def load_api_key() -> Optional[str]:
+    """The configured API key for URL triggers"""
+    return load_settings().get("app_settings", {}).get("api_key")
+
 def save_settings(settings: Dict[str, Any]) -> bool:
     """Save settings to file"""
     try:
         # Ensure directory exists
         SETTINGS_FILE.parent.mkdir(parents=True, exist_ok=True)
         
-        with open(SETTINGS_FILE, 'w') as f:
-            json.dump(settings, f, indent=2)
+        # Write a temp file and rename it over settings.json, so readers never see a partial file
+        tmp_file = SETTINGS_FILE.with_suffix(".json.tmp")
+        tmp_file.write_bytes(orjson.dumps(settings, option=orjson.OPT_INDENT_2))
+        os.replace(tmp_file, SETTINGS_FILE)
+        
+        # Force a reload on the next read, even if the mtime didn't move
+        with _settings_cache_lock:
+            _settings_cache["mtime_ns"] = None
         return True
     except Exception as e:
         print(f"Error saving settings: {e}")
@@ -78,6 +106,7 @@ async def get_settings():
 async def update_settings(settings: Dict[str, Any]):
     """Update all settings"""
     if save_settings(settings):
+        email_service.invalidate()
         return {"message": "Settings updated successfully"}
     else:
         raise HTTPException(status_code=500, detail="Failed to save settings")
@@ -91,10 +120,10 @@ async def get_email_settings():
 @router.put("/email")
 async def update_email_settings(email_settings: EmailSettings):
     """Update email settings"""
-    settings = load_settings()
-    settings["email_settings"] = email_settings.dict()
+    settings = {**load_settings(), "email_settings": email_settings.dict()}
     
     if save_settings(settings):
+        email_service.invalidate()
         return {"message": "Email settings updated successfully"}
     else:
         raise HTTPException(status_code=500, detail="Failed to save email settings")
@@ -113,7 +142,7 @@ async def test_email_settings(email_settings: EmailSettings):
         test_service.enabled = True
         
         # Test the connection
-        result = test_service.test_connection()
+        result = await run_in_threadpool(test_service.test_connection)
         
         if result["success"]:
             return {"success": True, "message": "Email connection test successful"}
@@ -132,8 +161,7 @@ async def get_app_settings():
 @router.put("/app")
 async def update_app_settings(app_settings: AppSettings):
     """Update application settings"""
-    settings = load_settings()
-    settings["app_settings"] = app_settings.dict()
+    settings = {**load_settings(), "app_settings": app_settings.dict()}
     
     if save_settings(settings):
         return {"message": "Application settings updated successfully"}
@@ -148,9 +176,7 @@ async def generate_api_key():
     
     # Update the settings with the new API key
     settings = load_settings()
-    if "app_settings" not in settings:
-        settings["app_settings"] = {}
-    settings["app_settings"]["api_key"] = api_key
+    settings = {**settings, "app_settings": {**settings.get("app_settings", {}), "api_key": api_key}}
     
     if save_settings(settings):
         return {"api_key": api_key, "message": "API key generated successfully"}
@@ -4,9 +4,13 @@ from jose import JWTError, jwt
 from passlib.context import CryptContext
 from datetime import datetime, timedelta
 from typing import Optional
+import bcrypt
+import hmac
 import os
+import threading
+import time
 
-from .database import get_db, hash_password
+from .database import get_db, prehash_password, is_legacy_password_hash
 
 SECRET_KEY = os.getenv("PYSCHED_SECRET_KEY", "your-secret-key-change-me")
 ALGORITHM = "HS256"
@@ -15,9 +19,44 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 30
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 security = HTTPBearer()
 
+# Short-lived cache of user rows keyed by JWT subject, so hot users
+# don't cost a query on every authenticated request
+USER_CACHE_TTL_SECONDS = 60
+USER_CACHE_MAX_SIZE = 1024
+_user_cache: dict = {}
+_user_cache_lock = threading.Lock()
+
+def _get_cached_user(username: str) -> Optional[dict]:
+    """Return cached user row if present and not expired"""
+    with _user_cache_lock:
+        entry = _user_cache.get(username)
+        if entry is None:
+            return None
+        expires_at, user = entry
+        if expires_at < time.monotonic():
+            del _user_cache[username]
+            return None
+        return user
+
+def _cache_user(username: str, user: dict):
+    """Store user row in cache, evicting the oldest entry when full"""
+    with _user_cache_lock:
+        if username not in _user_cache and len(_user_cache) >= USER_CACHE_MAX_SIZE:
+            _user_cache.pop(next(iter(_user_cache)))
+        _user_cache[username] = (time.monotonic() + USER_CACHE_TTL_SECONDS, user)
+
+def invalidate_user_cache(username: str):
+    """Drop cached user row after it has been modified"""
+    with _user_cache_lock:
+        _user_cache.pop(username, None)
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verify password against hash"""
-    return hash_password(plain_password) == hashed_password
+    """Verify password against bcrypt hash, or a legacy SHA-256 hash (constant-time)"""
+    # A legacy hash is the unsalted SHA-256 hex digest, i.e. exactly the bcrypt prehash
+    digest = prehash_password(plain_password)
+    if is_legacy_password_hash(hashed_password):
+        return hmac.compare_digest(digest, hashed_password.encode())
+    return bcrypt.checkpw(digest, hashed_password.encode())
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Create JWT access token"""
@@ -45,12 +84,19 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
     except JWTError:
         raise credentials_exception
     
+    user = _get_cached_user(username)
+    if user is not None:
+        return dict(user)
+    
     with get_db() as conn:
         cursor = conn.execute("SELECT * FROM users WHERE username = ?", (username,))
         user = cursor.fetchone()
         if user is None:
             raise credentials_exception
-        return dict(user)
+        user = dict(user)
+    
+    _cache_user(username, user)
+    return dict(user)
 
 async def get_current_admin_user(current_user: dict = Depends(get_current_user)):
     """Get current admin user"""
@@ -1,161 +1,287 @@
 import sqlite3
 import os
+import queue
 from contextlib import contextmanager
 from pathlib import Path
-from typing import Generator
+from typing import Generator, Union
 import hashlib
+import bcrypt
 
 DATABASE_PATH = Path(os.getenv("TEMPO_DATA_PATH", "./data")) / "tempo.db"
 
+# Prepared statements kept per connection (sqlite3 default is 128)
+CACHED_STATEMENTS = 512
+
+# bcrypt work factor; each +1 doubles hashing time
+BCRYPT_COST = int(os.getenv("BCRYPT_COST", "12"))
+
+# Number of idle connections kept open for reuse
+DB_POOL_SIZE = int(os.getenv("TEMPO_DB_POOL_SIZE", "8"))
+
+# Stored in PRAGMA user_version once the schema and migrations are applied;
+# bump it whenever init_database's schema or migrate_database changes
+SCHEMA_VERSION = 1
+
+# How often the app refreshes query planner statistics
+OPTIMIZE_INTERVAL_SECONDS = 24 * 60 * 60
+
+class ConnectionPool:
+    """Bounded pool of long-lived SQLite connections (the database is in WAL mode, see init_database)"""
+    
+    def __init__(self, database_path: Path, size: int):
+        self.database_path = database_path
+        self._idle = queue.Queue(maxsize=size)
+    
+    def _connect(self) -> sqlite3.Connection:
+        """Open a new connection with per-connection PRAGMAs applied"""
+        self.database_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(
+            str(self.database_path),
+            timeout=30.0,
+            check_same_thread=False,
+            cached_statements=CACHED_STATEMENTS
+        )
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA foreign_keys = ON")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        conn.execute("PRAGMA mmap_size = 268435456")
+        # 64 MiB page cache per connection (negative value is KiB)
+        conn.execute("PRAGMA cache_size = -65536")
+        return conn
+    
+    def warm(self):
+        """Open connections up to the pool size so first requests skip setup"""
+        while not self._idle.full():
+            try:
+                self._idle.put_nowait(self._connect())
+            except queue.Full:
+                break
+    
+    def acquire(self) -> sqlite3.Connection:
+        """Take an idle connection, opening a new one if none is available"""
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return self._connect()
+    
+    def release(self, conn: sqlite3.Connection):
+        """Return connection to the pool, closing it if the pool is full"""
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+    
+    def reset(self):
+        """Forget idle connections without closing them, e.g. ones inherited across fork"""
+        self._idle = queue.Queue(maxsize=self._idle.maxsize)
+    
+    def close_all(self):
+        """Close every idle connection"""
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+db_pool = ConnectionPool(DATABASE_PATH, DB_POOL_SIZE)
+
 @contextmanager
 def get_db() -> Generator[sqlite3.Connection, None, None]:
-    """Database connection context manager"""
-    DATABASE_PATH.parent.mkdir(parents=True, exist_ok=True)
-    conn = sqlite3.connect(str(DATABASE_PATH), timeout=30.0)
-    conn.row_factory = sqlite3.Row
-    conn.execute("PRAGMA foreign_keys = ON")
+    """Database connection context manager (pooled)"""
+    conn = db_pool.acquire()
     try:
         yield conn
         conn.commit()
-    except Exception:
+    except BaseException:
+        # Also on task cancellation, so a pooled connection never goes back mid-transaction
         conn.rollback()
         raise
     finally:
-        conn.close()
+        db_pool.release(conn)
+
+def optimize_database():
+    """Let SQLite refresh planner statistics for tables that need it"""
+    with get_db() as conn:
+        conn.execute("PRAGMA optimize")
+
+def prehash_password(password: str) -> bytes:
+    """SHA-256 hex digest of password, so bcrypt never truncates at 72 bytes or a NUL"""
+    return hashlib.sha256(password.encode()).hexdigest().encode()
+
+def hash_password(password: Union[str, bytes]) -> str:
+    """Hash password using bcrypt over a SHA-256 prehash; bytes are taken as an
+    already computed prehash_password() digest"""
+    digest = password if isinstance(password, bytes) else prehash_password(password)
+    return bcrypt.hashpw(digest, bcrypt.gensalt(BCRYPT_COST)).decode()
+
+def is_legacy_password_hash(password_hash: str) -> bool:
+    """Check for an unsalted SHA-256 hash stored before bcrypt was used"""
+    return not password_hash.startswith("$2")
 
-def hash_password(password: str) -> str:
-    """Hash password using SHA-256"""
-    return hashlib.sha256(password.encode()).hexdigest()
+def get_table_columns(conn, table: str) -> set:
+    """Column names of a table, read from the schema rather than by probing with a query"""
+    return {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
 
 def migrate_database(conn):
     """Run database migrations"""
     # Migration 1: Add email_trigger_type field to scripts table
-    try:
-        cursor = conn.execute("SELECT email_trigger_type FROM scripts LIMIT 1")
-        cursor.fetchone()  # If this succeeds, the field exists
-    except Exception:
-        # Field doesn't exist, add it
+    if "email_trigger_type" not in get_table_columns(conn, "scripts"):
         conn.execute("ALTER TABLE scripts ADD COLUMN email_trigger_type TEXT DEFAULT 'all'")
         print("Added email_trigger_type field to scripts table")
+    
+    # Migration 2: Add updated_at field to triggers table (config cache key)
+    if "updated_at" not in get_table_columns(conn, "triggers"):
+        conn.execute("ALTER TABLE triggers ADD COLUMN updated_at TIMESTAMP")
+        print("Added updated_at field to triggers table")
+    
+    # Migration 3: Superseded by idx_execution_logs_script_started (adds id for keyset pagination)
+    conn.execute("DROP INDEX IF EXISTS idx_execution_logs_script_id")
+    
+    # Migration 4: Superseded by idx_scripts_folder_name (also serves list ordering)
+    conn.execute("DROP INDEX IF EXISTS idx_scripts_folder_id")
+    
+    # Migration 5: Gather planner statistics once so the composite indexes are preferred
+    cursor = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'")
+    if not cursor.fetchone():
+        conn.execute("ANALYZE")
+        print("Analyzed database for query planner statistics")
 
 def init_database():
     """Initialize database with schema"""
+    # INSERT/UPDATE/DELETE ... RETURNING is used throughout the API
+    if sqlite3.sqlite_version_info < (3, 35, 0):
+        raise RuntimeError(f"SQLite 3.35+ is required, found {sqlite3.sqlite_version}")
+    
     with get_db() as conn:
-        conn.executescript("""
-            -- Scripts table - Core script metadata
-            CREATE TABLE IF NOT EXISTS scripts (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                safe_name TEXT NOT NULL,
-                description TEXT DEFAULT '',
-                content TEXT NOT NULL,
-                folder_id INTEGER REFERENCES folders(id),
+        # WAL is persistent in the database file, so it is set once here rather than per connection
+        conn.execute("PRAGMA journal_mode = WAL")
+        
+        # Schema and migrations only run when the file is older than this code
+        if conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            conn.executescript("""
+                -- Scripts table - Core script metadata
+                CREATE TABLE IF NOT EXISTS scripts (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    name TEXT NOT NULL,
+                    safe_name TEXT NOT NULL,
+                    description TEXT DEFAULT '',
+                    content TEXT NOT NULL,
+                    folder_id INTEGER REFERENCES folders(id) ON DELETE RESTRICT,
                 
-                -- Environment settings
-                python_version TEXT DEFAULT '3.12',
-                requirements TEXT DEFAULT '',
+                    -- Environment settings
+                    python_version TEXT DEFAULT '3.12',
+                    requirements TEXT DEFAULT '',
                 
-                -- Status and statistics
-                enabled BOOLEAN DEFAULT true,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                last_executed_at TIMESTAMP,
-                execution_count INTEGER DEFAULT 0,
-                success_count INTEGER DEFAULT 0,
+                    -- Status and statistics
+                    enabled BOOLEAN DEFAULT true,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    last_executed_at TIMESTAMP,
+                    execution_count INTEGER DEFAULT 0,
+                    success_count INTEGER DEFAULT 0,
                 
-                -- Email notifications
-                email_notifications BOOLEAN DEFAULT false,
-                email_recipients TEXT DEFAULT '',
-                email_trigger_type TEXT DEFAULT 'all', -- 'all', 'success', 'failure'
+                    -- Email notifications
+                    email_notifications BOOLEAN DEFAULT false,
+                    email_recipients TEXT DEFAULT '',
+                    email_trigger_type TEXT DEFAULT 'all', -- 'all', 'success', 'failure'
                 
-                -- Environment variables and auto-save
-                environment_variables TEXT DEFAULT '{}',
-                auto_save BOOLEAN DEFAULT true,
+                    -- Environment variables and auto-save
+                    environment_variables TEXT DEFAULT '{}',
+                    auto_save BOOLEAN DEFAULT true,
                 
-                UNIQUE(name, folder_id),
-                UNIQUE(safe_name, folder_id)
-            );
-
-            -- Folders table - Simple organization
-            CREATE TABLE IF NOT EXISTS folders (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                parent_id INTEGER REFERENCES folders(id),
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    UNIQUE(name, folder_id),
+                    UNIQUE(safe_name, folder_id)
+                );
+
+                -- Folders table - Simple organization
+                CREATE TABLE IF NOT EXISTS folders (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    name TEXT NOT NULL,
+                    parent_id INTEGER REFERENCES folders(id) ON DELETE RESTRICT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 
-                UNIQUE(name, parent_id)
-            );
-
-            -- Triggers table - Scheduling configuration
-            CREATE TABLE IF NOT EXISTS triggers (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                script_id INTEGER REFERENCES scripts(id) ON DELETE CASCADE,
-                trigger_type TEXT NOT NULL,
-                config TEXT NOT NULL,
-                enabled BOOLEAN DEFAULT true,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                last_triggered_at TIMESTAMP,
-                next_run_at TIMESTAMP
-            );
-
-            -- Execution logs table - History and monitoring
-            CREATE TABLE IF NOT EXISTS execution_logs (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                script_id INTEGER REFERENCES scripts(id) ON DELETE CASCADE,
-                trigger_id INTEGER REFERENCES triggers(id) ON DELETE SET NULL,
+                    UNIQUE(name, parent_id)
+                );
+
+                -- Triggers table - Scheduling configuration
+                CREATE TABLE IF NOT EXISTS triggers (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    script_id INTEGER REFERENCES scripts(id) ON DELETE CASCADE,
+                    trigger_type TEXT NOT NULL,
+                    config TEXT NOT NULL,
+                    enabled BOOLEAN DEFAULT true,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    last_triggered_at TIMESTAMP,
+                    next_run_at TIMESTAMP,
+                    updated_at TIMESTAMP
+                );
+
+                -- Execution logs table - History and monitoring
+                CREATE TABLE IF NOT EXISTS execution_logs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    script_id INTEGER REFERENCES scripts(id) ON DELETE CASCADE,
+                    trigger_id INTEGER REFERENCES triggers(id) ON DELETE SET NULL,
                 
-                -- Execution timing
-                started_at TIMESTAMP NOT NULL,
-                finished_at TIMESTAMP,
-                duration_ms INTEGER,
+                    -- Execution timing
+                    started_at TIMESTAMP NOT NULL,
+                    finished_at TIMESTAMP,
+                    duration_ms INTEGER,
                 
-                -- Execution results
-                status TEXT NOT NULL,
-                exit_code INTEGER,
-                stdout TEXT,
-                stderr TEXT,
+                    -- Execution results
+                    status TEXT NOT NULL,
+                    exit_code INTEGER,
+                    stdout TEXT,
+                    stderr TEXT,
                 
-                -- Resource usage
-                max_memory_mb INTEGER,
-                max_cpu_percent DECIMAL(5,2),
+                    -- Resource usage
+                    max_memory_mb INTEGER,
+                    max_cpu_percent DECIMAL(5,2),
                 
-                -- Metadata
-                triggered_by TEXT
-            );
-
-            -- Users table - Simple authentication
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                username TEXT UNIQUE NOT NULL,
-                email TEXT UNIQUE NOT NULL,
-                password_hash TEXT NOT NULL,
+                    -- Metadata
+                    triggered_by TEXT
+                );
+
+                -- Users table - Simple authentication
+                CREATE TABLE IF NOT EXISTS users (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    username TEXT UNIQUE NOT NULL,
+                    email TEXT UNIQUE NOT NULL,
+                    password_hash TEXT NOT NULL,
                 
-                -- User preferences
-                theme TEXT DEFAULT 'dark',
-                timezone TEXT DEFAULT 'UTC',
+                    -- User preferences
+                    theme TEXT DEFAULT 'dark',
+                    timezone TEXT DEFAULT 'UTC',
                 
-                -- Status
-                is_admin BOOLEAN DEFAULT false,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                last_login_at TIMESTAMP
-            );
-
-            -- Settings table - Application configuration
-            CREATE TABLE IF NOT EXISTS settings (
-                key TEXT PRIMARY KEY,
-                value TEXT,
-                description TEXT
-            );
-
-            -- Create indexes
-            CREATE INDEX IF NOT EXISTS idx_execution_logs_script_id ON execution_logs(script_id, started_at DESC);
-            CREATE INDEX IF NOT EXISTS idx_execution_logs_status ON execution_logs(status, started_at DESC);
-            CREATE INDEX IF NOT EXISTS idx_scripts_folder_id ON scripts(folder_id);
-            CREATE INDEX IF NOT EXISTS idx_triggers_script_id ON triggers(script_id);
-        """)
-        
-        # Run migrations
-        migrate_database(conn)
+                    -- Status
+                    is_admin BOOLEAN DEFAULT false,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    last_login_at TIMESTAMP
+                );
+
+                -- Settings table - Application configuration
+                CREATE TABLE IF NOT EXISTS settings (
+                    key TEXT PRIMARY KEY,
+                    value TEXT,
+                    description TEXT
+                );
+
+                -- Create indexes
+                CREATE INDEX IF NOT EXISTS idx_execution_logs_script_started ON execution_logs(script_id, started_at DESC, id DESC);
+                CREATE INDEX IF NOT EXISTS idx_execution_logs_status ON execution_logs(status, started_at DESC);
+                CREATE INDEX IF NOT EXISTS idx_execution_logs_started_at ON execution_logs(started_at, status, duration_ms);
+                CREATE INDEX IF NOT EXISTS idx_execution_logs_trigger_id ON execution_logs(trigger_id)
+                    WHERE trigger_id IS NOT NULL;
+                CREATE INDEX IF NOT EXISTS idx_scripts_folder_name ON scripts(folder_id, name);
+                CREATE INDEX IF NOT EXISTS idx_folders_name ON folders(name);
+                CREATE INDEX IF NOT EXISTS idx_triggers_script_id ON triggers(script_id);
+                CREATE INDEX IF NOT EXISTS idx_triggers_next_run ON triggers(next_run_at)
+                    WHERE enabled = 1 AND next_run_at IS NOT NULL;
+            """)
+            
+            # Run migrations
+            migrate_database(conn)
+            conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
         
         # Create default admin user if none exists
         cursor = conn.execute("SELECT COUNT(*) FROM users")
@@ -189,11 +315,13 @@ def init_database():
             ('log_retention_days', '30', 'Days to keep execution logs'),
         ]
         
-        for key, value, description in settings:
-            conn.execute("""
-                INSERT OR IGNORE INTO settings (key, value, description)
-                VALUES (?, ?, ?)
-            """, (key, value, description))
+        conn.executemany("""
+            INSERT OR IGNORE INTO settings (key, value, description)
+            VALUES (?, ?, ?)
+        """, settings)
+        
+        # Check every table, analyzing any whose statistics are missing or stale
+        conn.execute("PRAGMA optimize = 0x10002")
 
 if __name__ == "__main__":
     init_database()
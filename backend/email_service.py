@@ -1,15 +1,42 @@
 import smtplib
+import logging
 import os
+import queue
+import threading
+import time
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from datetime import datetime
 from typing import Optional
 
+log = logging.getLogger(__name__)
+
+# Characters of script output included in a notification
+NOTIFICATION_OUTPUT_LIMIT = 2000
+
+def truncate_output(output: str) -> str:
+    """Script output cut to NOTIFICATION_OUTPUT_LIMIT characters, with '...' if it was longer"""
+    if len(output) <= NOTIFICATION_OUTPUT_LIMIT:
+        return output
+    return output[:NOTIFICATION_OUTPUT_LIMIT] + '...'
+
+# How long loaded SMTP settings are reused before checking settings.json again
+EMAIL_SETTINGS_TTL_SECONDS = 60
+
 class EmailService:
     def __init__(self):
         # Load email settings from database first, fall back to environment variables
         self._load_settings()
     
+    def invalidate(self):
+        """Reload SMTP settings on the next send (after they were changed)"""
+        self._settings_loaded_at = None
+    
+    def _refresh_settings(self):
+        """Reload settings once they are older than EMAIL_SETTINGS_TTL_SECONDS"""
+        if self._settings_loaded_at is None or time.monotonic() - self._settings_loaded_at > EMAIL_SETTINGS_TTL_SECONDS:
+            self._load_settings()
+    
     def _load_settings(self):
         """Load email settings from database or environment variables"""
         try:
@@ -33,11 +60,12 @@ class EmailService:
             self.from_email = os.getenv("FROM_EMAIL", "tempo@example.com")
         
         self.enabled = bool(self.smtp_server and self.smtp_username and self.smtp_password)
+        self._settings_loaded_at = time.monotonic()
     
     def send_script_notification(self, script_name: str, status: str, output: str, recipients: str):
         """Send email notification for script execution"""
-        # Reload settings each time to ensure we have the latest database configuration
-        self._load_settings()
+        # Pick up configuration changes without rereading settings on every send
+        self._refresh_settings()
         
         if not self.enabled or not recipients:
             return False
@@ -51,43 +79,46 @@ Status: {status.title()}
 Time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
 
 Output:
-{output[:2000]}{'...' if len(output) > 2000 else ''}
+{truncate_output(output)}
 
 ---
 Tempo Notification
         """
         
         # Send to each recipient
-        success_count = 0
-        for recipient in recipients.split(","):
-            recipient = recipient.strip()
-            if recipient:
-                try:
-                    if self._send_email(recipient, subject, body):
-                        success_count += 1
-                except Exception as e:
-                    print(f"Failed to send email to {recipient}: {e}")
-        
-        return success_count > 0
+        recipient_list = [recipient.strip() for recipient in recipients.split(",") if recipient.strip()]
+        return self._send_emails(recipient_list, subject, body) > 0
     
     def _send_email(self, to: str, subject: str, body: str) -> bool:
         """Send email via SMTP"""
+        return self._send_emails([to], subject, body) == 1
+    
+    def _send_emails(self, recipients: list, subject: str, body: str) -> int:
+        """Send one message per recipient over a single SMTP session; returns how many were sent"""
+        if not recipients:
+            return 0
+        
+        sent = 0
         try:
-            msg = MIMEText(body)
-            msg['Subject'] = subject
-            msg['From'] = self.from_email
-            msg['To'] = to
-            
             with smtplib.SMTP(self.smtp_server, self.smtp_port) as server:
                 server.starttls()
                 server.login(self.smtp_username, self.smtp_password)
-                server.send_message(msg)
-            
-            return True
+                
+                for recipient in recipients:
+                    msg = MIMEText(body)
+                    msg['Subject'] = subject
+                    msg['From'] = self.from_email
+                    msg['To'] = recipient
+                    try:
+                        server.send_message(msg)
+                        sent += 1
+                    except smtplib.SMTPException as e:
+                        log.warning("Failed to send email to %s: %s", recipient, e)
             
         except Exception as e:
-            print(f"SMTP error: {e}")
-            return False
+            log.exception("SMTP error sending to %d recipient(s)", len(recipients))
+        
+        return sent
     
     def test_connection(self) -> dict:
         """Test SMTP connection"""
@@ -111,6 +142,35 @@ def send_script_notification(script_name: str, status: str, output: str, recipie
     """Send script notification email"""
     return email_service.send_script_notification(script_name, status, output, recipients)
 
+# Notifications waiting for the background sender thread
+_notification_queue = queue.Queue()
+_notification_thread = None
+_notification_thread_lock = threading.Lock()
+
+def _run_notification_sender():
+    """Send queued notifications one at a time, forever"""
+    while True:
+        args = _notification_queue.get()
+        try:
+            send_script_notification(*args)
+        except Exception as e:
+            log.exception("Error sending notification for %s", args[0])
+        finally:
+            _notification_queue.task_done()
+
+def queue_script_notification(script_name: str, status: str, output: str, recipients: str):
+    """Send a script notification from a background thread, so the caller doesn't wait on SMTP"""
+    global _notification_thread
+    with _notification_thread_lock:
+        # Started lazily, so each forked worker process gets its own thread
+        if _notification_thread is None or not _notification_thread.is_alive():
+            _notification_thread = threading.Thread(
+                target=_run_notification_sender, name="email-notifications", daemon=True
+            )
+            _notification_thread.start()
+    # Only the part that goes in the email is kept, so large stdout can be freed now
+    _notification_queue.put((script_name, status, truncate_output(output), recipients))
+
 def test_email_connection() -> dict:
     """Test email connection"""
     return email_service.test_connection()
\ No newline at end of file
@@ -1,7 +1,10 @@
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, ORJSONResponse
+from fastapi.concurrency import run_in_threadpool
+import asyncio
+import contextlib
 import uvicorn
 import os
 from pathlib import Path
@@ -18,24 +21,28 @@ def get_version():
 
 APP_VERSION = get_version()
 
-from .database import init_database
+from .database import init_database, db_pool, optimize_database, OPTIMIZE_INTERVAL_SECONDS
 from .api import auth, scripts, folders, logs, execution, settings
 from .websocket_manager import WebSocketManager
 
-# Initialize database
-init_database()
-
 app = FastAPI(
     title="Tempo",
     description="Python Script Scheduler & Monitor",
     version=APP_VERSION,
-    redirect_slashes=False
+    redirect_slashes=False,
+    default_response_class=ORJSONResponse
 )
 
-# CORS middleware
+# CORS middleware; the UI is served same-origin, so only the Vite dev server needs listing by default
+CORS_ORIGINS = [
+    origin.strip()
+    for origin in os.getenv("TEMPO_CORS_ORIGINS", "http://localhost:3000").split(",")
+    if origin.strip()
+]
+
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],
+    allow_origins=CORS_ORIGINS,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
@@ -44,6 +51,55 @@ app.add_middleware(
 # WebSocket manager for real-time updates
 ws_manager = WebSocketManager()
 
+@app.on_event("startup")
+async def open_database_pool():
+    """Create or migrate the schema, then open pooled connections before serving requests"""
+    init_database()
+    db_pool.warm()
+
+@app.on_event("startup")
+async def start_auto_save_flusher():
+    """Start the background writer for buffered script auto-saves"""
+    app.state.auto_save_flusher = asyncio.create_task(scripts.run_auto_save_flusher())
+
+async def run_database_optimizer():
+    """Run PRAGMA optimize once a day while the app is up"""
+    while True:
+        await asyncio.sleep(OPTIMIZE_INTERVAL_SECONDS)
+        try:
+            await asyncio.to_thread(optimize_database)
+        except Exception as e:
+            print(f"Error optimizing database: {e}")
+
+@app.on_event("startup")
+async def start_database_optimizer():
+    """Start the daily PRAGMA optimize task"""
+    app.state.database_optimizer = asyncio.create_task(run_database_optimizer())
+
+@app.on_event("shutdown")
+async def stop_auto_save_flusher():
+    """Stop the auto-save writer and flush whatever is still buffered"""
+    # Holding the lock means the flusher isn't mid-write when it is cancelled
+    async with scripts.auto_save_write_lock:
+        app.state.auto_save_flusher.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await app.state.auto_save_flusher
+        await run_in_threadpool(scripts.write_auto_saves, scripts.take_pending_auto_saves())
+
+@app.on_event("shutdown")
+async def stop_database_optimizer():
+    """Stop the daily optimizer and optimize once more before closing"""
+    app.state.database_optimizer.cancel()
+    try:
+        optimize_database()
+    except Exception as e:
+        print(f"Error optimizing database: {e}")
+
+@app.on_event("shutdown")
+async def close_database_pool():
+    """Close pooled database connections"""
+    db_pool.close_all()
+
 
 # Version and health endpoints
 @app.get("/api/version")
@@ -85,8 +141,9 @@ async def websocket_endpoint(websocket: WebSocket):
 
 # Serve frontend static files (if they exist) - MUST be last
 frontend_dist = Path(__file__).parent.parent / "frontend"
-if frontend_dist.exists():
-    app.mount("/", StaticFiles(directory=str(frontend_dist), html=True), name="static")
+if frontend_dist.is_dir():
+    # Existence is checked here, so StaticFiles doesn't need to re-check the directory
+    app.mount("/", StaticFiles(directory=str(frontend_dist), html=True, check_dir=False), name="static")
 
 # Global exception handler
 @app.exception_handler(Exception)
@@ -98,4 +155,4 @@ async def global_exception_handler(request, exc):
 
 if __name__ == "__main__":
     port = int(os.getenv("PORT", 8000))
-    uvicorn.run(app, host="0.0.0.0", port=port, reload=True)
\ No newline at end of file
+    uvicorn.run(app, host="0.0.0.0", port=port, reload=True, loop="uvloop")
\ No newline at end of file
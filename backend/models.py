@@ -1,8 +1,13 @@
 from pydantic import BaseModel, Field, validator
 from typing import Optional, List, Dict, Any
 from datetime import datetime
-import json
 import re
+import orjson
+
+# Validator patterns, compiled once at import.
+# A requirement line is a package name, optionally followed by version specifiers.
+_REQ_NAME_RE = re.compile(r'^[a-zA-Z0-9][a-zA-Z0-9._-]*\s*(?:[<>=~!].*)?$')
+_ENV_KEY_RE = re.compile(r'^[A-Z_][A-Z0-9_]*$')
 
 class ScriptCreate(BaseModel):
     name: str = Field(..., min_length=1, max_length=100)
@@ -24,7 +29,8 @@ class ScriptCreate(BaseModel):
             raise ValueError('Script content cannot be empty')
         
         try:
-            compile(v, '<script>', 'exec')
+            # Compiling is the only full syntax check; don't inherit this module's future flags
+            compile(v, '<script>', 'exec', dont_inherit=True, optimize=2)
         except SyntaxError as e:
             raise ValueError(f'Invalid Python syntax: {e}')
         
@@ -41,8 +47,7 @@ class ScriptCreate(BaseModel):
             line = line.strip()
             if line and not line.startswith('#'):
                 # Basic package name validation
-                package_name = line.split('==')[0].split('>=')[0].split('<=')[0].split('~=')[0].strip()
-                if not re.match(r'^[a-zA-Z0-9][a-zA-Z0-9\-_\.]*$', package_name):
+                if not _REQ_NAME_RE.match(line):
                     raise ValueError(f'Invalid package name in requirements: {line}')
         
         return v
@@ -54,18 +59,20 @@ class ScriptCreate(BaseModel):
             return '{}'
         
         try:
-            env_dict = json.loads(v)
-            if not isinstance(env_dict, dict):
+            env_dict = orjson.loads(v)
+            if type(env_dict) is not dict:
                 raise ValueError('Environment variables must be a JSON object')
             
+            # JSON object keys are always strings; stop at the first bad entry
+            match_key = _ENV_KEY_RE.match
             for key, value in env_dict.items():
-                if not isinstance(key, str) or not isinstance(value, str):
+                if type(value) is not str:
                     raise ValueError('Environment variable names and values must be strings')
-                if not re.match(r'^[A-Z_][A-Z0-9_]*$', key):
+                if not match_key(key):
                     raise ValueError(f'Invalid environment variable name: {key}')
             
             return v
-        except json.JSONDecodeError:
+        except orjson.JSONDecodeError:
             raise ValueError('Environment variables must be valid JSON')
 
 class ScriptUpdate(BaseModel):
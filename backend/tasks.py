@@ -1,16 +1,19 @@
-from celery import Celery
+from celery import Celery, group
+from kombu import Queue
 from celery.schedules import crontab
+from celery.signals import worker_process_init
 import asyncio
-import json
+import orjson
+import threading
+import uvloop
 from datetime import datetime, timedelta
 from typing import Dict, Any
 from croniter import croniter
 
-from .database import get_db
+from .database import get_db, db_pool
 from .virtual_env import VirtualEnvironmentManager
 from .websocket_manager import broadcast_event
-from .email_service import send_script_notification
-from .timezone_utils import format_datetime_for_api
+from .email_service import queue_script_notification
 
 # Celery configuration
 celery_app = Celery(
@@ -29,68 +32,153 @@ celery_app.conf.update(
     task_track_started=True,
     task_time_limit=30 * 60,  # 30 minutes
     task_soft_time_limit=25 * 60,  # 25 minutes
+    # Script runs are long and I/O-bound (subprocess, DB, SMTP); reserving
+    # only one message per process keeps a busy worker from holding queued
+    # runs that an idle worker could start
     worker_prefetch_multiplier=1,
     worker_max_tasks_per_child=1000,
+    # Acknowledge after the task finishes so a run is redelivered, not lost,
+    # if its worker process dies mid-execution
+    task_acks_late=True,
+    task_reject_on_worker_lost=True,
+    # Workers consume every queue listed here unless started with -Q, so
+    # maintenance can be given its own worker without changing deployments
+    task_queues=(Queue('scripts'), Queue('maint')),
+    task_default_queue='scripts',
+    task_routes={
+        'backend.tasks.cleanup_old_logs': {'queue': 'maint'},
+        'backend.tasks.process_scheduled_triggers': {'queue': 'maint'},
+        'backend.tasks.execute_startup_triggers': {'queue': 'maint'},
+    },
 )
 
+# Event loop reused by every task in this process (see run_async)
+_worker_loop = None
+
+@worker_process_init.connect
+def open_worker_database_pool(**kwargs):
+    """Give each forked worker process its own warm connections; SQLite
+    connections must not be shared across fork"""
+    db_pool.reset()
+    db_pool.warm()
+
+@worker_process_init.connect
+def open_worker_event_loop(**kwargs):
+    """Give each forked worker process its own event loop"""
+    global _worker_loop
+    _worker_loop = uvloop.new_event_loop()
+    asyncio.set_event_loop(_worker_loop)
+
+# Loop on a daemon thread that delivers broadcasts off the task's critical path
+_broadcast_loop = None
+
+def queue_broadcast(event_type: str, data: Dict[str, Any]):
+    """Schedule a broadcast on the background loop without waiting for it"""
+    global _broadcast_loop
+    if _broadcast_loop is None:
+        # Started lazily so each forked worker gets its own thread
+        _broadcast_loop = uvloop.new_event_loop()
+        threading.Thread(
+            target=_broadcast_loop.run_forever,
+            name="tempo-broadcast",
+            daemon=True
+        ).start()
+    asyncio.run_coroutine_threadsafe(broadcast_event(event_type, data), _broadcast_loop)
+
+def run_async(coro):
+    """Run coroutine to completion on this process's event loop instead of
+    building and tearing down a new loop per call like asyncio.run"""
+    global _worker_loop
+    if _worker_loop is None or _worker_loop.is_closed():
+        _worker_loop = uvloop.new_event_loop()
+        asyncio.set_event_loop(_worker_loop)
+    return _worker_loop.run_until_complete(coro)
+
+# Statements run on every execution, kept as constants so each pooled
+# connection reuses one prepared statement; always bind values as parameters
+_SQL_ENABLED_SCRIPT_WITH_FOLDER = """
+    SELECT s.*, f.name as folder_name FROM scripts s
+    LEFT JOIN folders f ON s.folder_id = f.id
+    WHERE s.id = ? AND s.enabled = true
+"""
+_SQL_START_EXECUTION_LOG = """
+    INSERT INTO execution_logs (
+        script_id, trigger_id, started_at, status, triggered_by
+    ) VALUES (?, ?, strftime('%Y-%m-%dT%H:%M:%fZ', 'now'), 'running', ?)
+"""
+_SQL_FINISH_EXECUTION_LOG = """
+    UPDATE execution_logs SET
+        finished_at = strftime('%Y-%m-%dT%H:%M:%fZ', 'now'),
+        duration_ms = ?,
+        status = ?,
+        exit_code = ?,
+        stdout = ?,
+        stderr = ?
+    WHERE id = ?
+"""
+_SQL_RECORD_SCRIPT_RUN = """
+    UPDATE scripts SET
+        last_executed_at = CURRENT_TIMESTAMP,
+        execution_count = execution_count + 1,
+        success_count = success_count + ?
+    WHERE id = ?
+"""
+_SQL_FAIL_EXECUTION_LOG = """
+    UPDATE execution_logs SET
+        finished_at = strftime('%Y-%m-%dT%H:%M:%fZ', 'now'),
+        status = 'failed',
+        stderr = ?
+    WHERE id = ?
+"""
+
+_SQL_RECORD_TRIGGER_RUN = """
+    UPDATE triggers SET
+        last_triggered_at = ?,
+        next_run_at = ?
+    WHERE id = ?
+"""
+_SQL_TOUCH_STARTUP_TRIGGER = "UPDATE triggers SET last_triggered_at = CURRENT_TIMESTAMP WHERE id = ?"
+
 @celery_app.task(bind=True)
 def execute_script_task(self, script_id: int, trigger_id: int = None, triggered_by: str = "schedule"):
     """Execute a script and log results"""
     execution_log_id = None
     
     try:
-        # Get script details
+        # Get script details and create the execution log on one connection
         with get_db() as conn:
-            cursor = conn.execute("""
-                SELECT s.*, f.name as folder_name FROM scripts s
-                LEFT JOIN folders f ON s.folder_id = f.id
-                WHERE s.id = ? AND s.enabled = true
-            """, (script_id,))
+            cursor = conn.execute(_SQL_ENABLED_SCRIPT_WITH_FOLDER, (script_id,))
             script = cursor.fetchone()
             
             if not script:
                 return {"error": "Script not found or disabled"}
-        
-        # Create execution log
-        with get_db() as conn:
-            cursor = conn.execute("""
-                INSERT INTO execution_logs (
-                    script_id, trigger_id, started_at, status, triggered_by
-                ) VALUES (?, ?, ?, 'running', ?)
-            """, (script_id, trigger_id, format_datetime_for_api(datetime.now()), triggered_by))
+            
+            cursor = conn.execute(_SQL_START_EXECUTION_LOG, (script_id, trigger_id, triggered_by))
             execution_log_id = cursor.lastrowid
         
         # Broadcast execution start
-        asyncio.run(broadcast_event("script_execution_started", {
+        queue_broadcast("script_execution_started", {
             "script_id": script_id,
             "execution_log_id": execution_log_id,
             "script_name": script["name"]
-        }))
+        })
         
         # Get folder path for script execution
         folder_path = script["folder_name"] or ""
         
         # Execute script
         manager = VirtualEnvironmentManager(script["safe_name"], folder_path)
-        result = asyncio.run(manager.execute_script(
+        result = run_async(manager.execute_script(
             script["content"], 
             script["environment_variables"] or "{}"
         ))
         
-        # Update execution log
+        # Update execution log and script statistics in one write transaction
         status = "success" if result["exit_code"] == 0 else "failed"
         with get_db() as conn:
-            conn.execute("""
-                UPDATE execution_logs SET
-                    finished_at = ?,
-                    duration_ms = ?,
-                    status = ?,
-                    exit_code = ?,
-                    stdout = ?,
-                    stderr = ?
-                WHERE id = ?
-            """, (
-                format_datetime_for_api(datetime.now()),
+            # Take the write lock up front instead of upgrading mid-transaction
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(_SQL_FINISH_EXECUTION_LOG, (
                 result["duration_ms"],
                 status,
                 result["exit_code"],
@@ -100,13 +188,7 @@ def execute_script_task(self, script_id: int, trigger_id: int = None, triggered_
             ))
             
             # Update script statistics
-            conn.execute("""
-                UPDATE scripts SET
-                    last_executed_at = CURRENT_TIMESTAMP,
-                    execution_count = execution_count + 1,
-                    success_count = success_count + ?
-                WHERE id = ?
-            """, (1 if status == "success" else 0, script_id))
+            conn.execute(_SQL_RECORD_SCRIPT_RUN, (1 if status == "success" else 0, script_id))
         
         # Send email notification if enabled and trigger conditions are met
         if script["email_notifications"] and script["email_recipients"]:
@@ -121,7 +203,7 @@ def execute_script_task(self, script_id: int, trigger_id: int = None, triggered_
                 should_send_email = True
             
             if should_send_email:
-                send_script_notification(
+                queue_script_notification(
                     script["name"],
                     status,
                     result["stdout"] + "\n" + result["stderr"],
@@ -129,12 +211,12 @@ def execute_script_task(self, script_id: int, trigger_id: int = None, triggered_
                 )
         
         # Broadcast execution completion
-        asyncio.run(broadcast_event("script_execution_completed", {
+        queue_broadcast("script_execution_completed", {
             "script_id": script_id,
             "execution_log_id": execution_log_id,
             "status": status,
             "script_name": script["name"]
-        }))
+        })
         
         return {
             "success": True,
@@ -149,20 +231,14 @@ def execute_script_task(self, script_id: int, trigger_id: int = None, triggered_
         # Log error
         if execution_log_id:
             with get_db() as conn:
-                conn.execute("""
-                    UPDATE execution_logs SET
-                        finished_at = ?,
-                        status = 'failed',
-                        stderr = ?
-                    WHERE id = ?
-                """, (format_datetime_for_api(datetime.now()), str(exc), execution_log_id))
+                conn.execute(_SQL_FAIL_EXECUTION_LOG, (str(exc), execution_log_id))
         
         # Broadcast error
-        asyncio.run(broadcast_event("script_execution_error", {
+        queue_broadcast("script_execution_error", {
             "script_id": script_id,
             "execution_log_id": execution_log_id,
             "error": str(exc)
-        }))
+        })
         
         # Retry logic
         if self.request.retries < 3:
@@ -170,6 +246,15 @@ def execute_script_task(self, script_id: int, trigger_id: int = None, triggered_
         
         return {"error": str(exc)}
 
+def dispatch_script_runs(runs, triggered_by: str):
+    """Queue (script_id, trigger_id) runs as one group; nothing waits on
+    triggered runs, so their results are not stored"""
+    if runs:
+        group(
+            execute_script_task.s(script_id, trigger_id, triggered_by)
+            for script_id, trigger_id in runs
+        ).apply_async(ignore_result=True)
+
 @celery_app.task
 def create_virtual_environment(script_id: int):
     """Create virtual environment for script"""
@@ -187,20 +272,20 @@ def create_virtual_environment(script_id: int):
         
         folder_path = script["folder_name"] or ""
         manager = VirtualEnvironmentManager(script["safe_name"], folder_path)
-        result = asyncio.run(manager.create_environment(script["python_version"]))
+        result = run_async(manager.create_environment(script["python_version"]))
         
         # Install requirements if provided
         if result["success"] and script["requirements"]:
-            install_result = asyncio.run(manager.install_requirements(script["requirements"]))
+            install_result = run_async(manager.install_requirements(script["requirements"]))
             if not install_result["success"]:
                 result["warning"] = f"Environment created but requirements failed: {install_result.get('error', 'Unknown error')}"
         
         # Broadcast environment ready
-        asyncio.run(broadcast_event("script_environment_ready", {
+        queue_broadcast("script_environment_ready", {
             "script_id": script_id,
             "success": result["success"],
             "script_name": script["name"]
-        }))
+        })
         
         return result
         
@@ -224,44 +309,56 @@ def update_virtual_environment(script_id: int):
         
         folder_path = script["folder_name"] or ""
         manager = VirtualEnvironmentManager(script["safe_name"], folder_path)
-        result = asyncio.run(manager.install_requirements(script["requirements"]))
+        result = run_async(manager.install_requirements(script["requirements"]))
         
         return result
         
     except Exception as e:
         return {"error": str(e)}
 
+_SQL_CLEANUP_SETTINGS = """
+    SELECT key, value FROM settings
+    WHERE key IN ('max_execution_logs', 'log_retention_days')
+"""
+_SQL_LOGGED_SCRIPT_IDS = "SELECT DISTINCT script_id FROM execution_logs"
+# Per-script top-K walked along idx_execution_logs_script_started
+_SQL_TRIM_SCRIPT_EXECUTION_LOGS = """
+    DELETE FROM execution_logs
+    WHERE id IN (
+        SELECT id FROM execution_logs
+        WHERE script_id = ?
+        ORDER BY started_at DESC, id DESC
+        LIMIT -1 OFFSET ?
+    )
+"""
+_SQL_EXPIRE_EXECUTION_LOGS = """
+    DELETE FROM execution_logs 
+    WHERE started_at < datetime('now', '-' || ? || ' days')
+"""
+
 @celery_app.task
 def cleanup_old_logs():
     """Clean up old execution logs"""
     try:
         with get_db() as conn:
-            # Get cleanup settings or use defaults
-            cursor = conn.execute("SELECT value FROM settings WHERE key = 'max_execution_logs'")
-            result = cursor.fetchone()
-            max_logs = int(result["value"]) if result else 100
+            # Take the write lock up front; both deletes commit together
+            conn.execute("BEGIN IMMEDIATE")
             
-            cursor = conn.execute("SELECT value FROM settings WHERE key = 'log_retention_days'")
-            result = cursor.fetchone()
-            retention_days = int(result["value"]) if result else 30
+            # Get cleanup settings or use defaults
+            cursor = conn.execute(_SQL_CLEANUP_SETTINGS)
+            cleanup_settings = dict(cursor.fetchall())
+            max_logs = int(cleanup_settings.get("max_execution_logs", 100))
+            retention_days = int(cleanup_settings.get("log_retention_days", 30))
             
             # Keep only the most recent logs per script
-            conn.execute("""
-                DELETE FROM execution_logs 
-                WHERE id NOT IN (
-                    SELECT id FROM (
-                        SELECT id, ROW_NUMBER() OVER (PARTITION BY script_id ORDER BY started_at DESC) as rn
-                        FROM execution_logs
-                    ) ranked
-                    WHERE rn <= ?
-                )
-            """, (max_logs,))
+            script_ids = conn.execute(_SQL_LOGGED_SCRIPT_IDS).fetchall()
+            conn.executemany(
+                _SQL_TRIM_SCRIPT_EXECUTION_LOGS,
+                ((row["script_id"], max_logs) for row in script_ids)
+            )
             
             # Delete logs older than retention period
-            cursor = conn.execute("""
-                DELETE FROM execution_logs 
-                WHERE started_at < datetime('now', '-{} days')
-            """.format(retention_days))
+            cursor = conn.execute(_SQL_EXPIRE_EXECUTION_LOGS, (retention_days,))
             
             deleted_count = cursor.rowcount
             
@@ -270,6 +367,46 @@ def cleanup_old_logs():
     except Exception as e:
         return {"error": str(e)}
 
+# Coarse due filter, always a superset of the Python checks in
+# process_scheduled_triggers: timestamps are compared to the second and
+# interval triggers are given a second of slack. Rows whose timestamps
+# SQLite cannot read are returned too, since the loop runs those anyway.
+_SQL_DUE_TRIGGERS = """
+    SELECT t.*, s.name as script_name 
+    FROM triggers t
+    JOIN scripts s ON t.script_id = s.id
+    WHERE t.enabled = true AND s.enabled = true
+    AND (
+        (t.trigger_type = 'cron' AND (
+            t.next_run_at IS NULL
+            OR julianday(substr(t.next_run_at, 1, 19)) IS NULL
+            OR substr(t.next_run_at, 1, 19) <= :now
+        ))
+        OR (t.trigger_type = 'interval' AND (
+            t.last_triggered_at IS NULL
+            OR julianday(substr(t.last_triggered_at, 1, 19)) IS NULL
+            OR julianday(substr(t.last_triggered_at, 1, 19))
+                + coalesce(json_extract(t.config, '$.seconds'), 3600) / 86400.0
+                <= julianday(:now_slack)
+        ))
+    )
+"""
+
+# croniter instances keyed by expression, so each cron string is parsed once
+CRON_CACHE_MAX_SIZE = 1024
+_cron_cache: Dict[str, croniter] = {}
+
+def next_cron_run(expression: str, now: datetime) -> datetime:
+    """Next fire time after now for a cron expression"""
+    cron = _cron_cache.get(expression)
+    if cron is None:
+        if len(_cron_cache) >= CRON_CACHE_MAX_SIZE:
+            _cron_cache.clear()
+        cron = _cron_cache[expression] = croniter(expression, now)
+    else:
+        cron.set_current(now, force=True)
+    return cron.get_next(datetime)
+
 @celery_app.task
 def process_scheduled_triggers():
     """Process scheduled triggers (cron and interval)"""
@@ -277,21 +414,22 @@ def process_scheduled_triggers():
     # Process scheduled triggers silently
     try:
         with get_db() as conn:
-            # Get all enabled triggers
-            cursor = conn.execute("""
-                SELECT t.*, s.name as script_name 
-                FROM triggers t
-                JOIN scripts s ON t.script_id = s.id
-                WHERE t.enabled = true AND s.enabled = true
-            """)
+            # Get enabled triggers that may be due; the checks below stay exact
+            cursor = conn.execute(_SQL_DUE_TRIGGERS, {
+                "now": now.isoformat(timespec="seconds"),
+                "now_slack": (now + timedelta(seconds=1)).isoformat(timespec="seconds"),
+            })
             
             triggers = cursor.fetchall()
-            processed = 0
+            
+            # (last_triggered_at, next_run_at, id) for each fired trigger, and the runs to queue
+            trigger_updates = []
+            dispatches = []
             
             # Process all enabled triggers
             
             for trigger in triggers:
-                trigger_config = json.loads(trigger["config"])
+                trigger_config = orjson.loads(trigger["config"])
                 should_execute = False
                 
                 if trigger["trigger_type"] == "interval":
@@ -336,8 +474,8 @@ def process_scheduled_triggers():
                         should_execute = True
                 
                 if should_execute:
-                    # Queue script execution
-                    execute_script_task.delay(trigger["script_id"], trigger["id"], "schedule")
+                    # Queue script execution once the trigger updates are committed
+                    dispatches.append((trigger["script_id"], trigger["id"]))
                     
                     # Update trigger last run time and calculate next run
                     next_run_at = None
@@ -347,21 +485,20 @@ def process_scheduled_triggers():
                     elif trigger["trigger_type"] == "cron":
                         # Calculate next run time using croniter
                         cron_expression = trigger_config.get("expression", "0 * * * *")
-                        cron = croniter(cron_expression, now)
-                        next_run_at = cron.get_next(datetime).isoformat()
+                        next_run_at = next_cron_run(cron_expression, now).isoformat()
                     
                     # Use consistent datetime format for database
                     current_time = now.isoformat()
-                    conn.execute("""
-                        UPDATE triggers SET 
-                            last_triggered_at = ?,
-                            next_run_at = ?
-                        WHERE id = ?
-                    """, (current_time, next_run_at, trigger["id"]))
-                    
-                    processed += 1
+                    trigger_updates.append((current_time, next_run_at, trigger["id"]))
             
-            return {"success": True, "processed": processed}
+            # One statement and one commit for every fired trigger
+            if trigger_updates:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.executemany(_SQL_RECORD_TRIGGER_RUN, trigger_updates)
+        
+        dispatch_script_runs(dispatches, "schedule")
+        
+        return {"success": True, "processed": len(dispatches)}
             
     except Exception as e:
         return {"error": str(e)}
@@ -381,21 +518,15 @@ def execute_startup_triggers():
             """)
             
             triggers = cursor.fetchall()
-            processed = 0
-            
-            for trigger in triggers:
-                # Queue script execution
-                execute_script_task.delay(trigger["script_id"], trigger["id"], "startup")
-                
-                # Update trigger last run time
-                conn.execute("""
-                    UPDATE triggers SET last_triggered_at = CURRENT_TIMESTAMP
-                    WHERE id = ?
-                """, (trigger["id"],))
-                
-                processed += 1
             
-            return {"success": True, "processed": processed}
+            # Update trigger last run time
+            if triggers:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.executemany(_SQL_TOUCH_STARTUP_TRIGGER, [(trigger["id"],) for trigger in triggers])
+        
+        dispatch_script_runs([(trigger["script_id"], trigger["id"]) for trigger in triggers], "startup")
+        
+        return {"success": True, "processed": len(triggers)}
             
     except Exception as e:
         return {"error": str(e)}
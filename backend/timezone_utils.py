@@ -1,4 +1,5 @@
 from datetime import datetime
+from functools import lru_cache
 from typing import Optional, List
 import pytz
 
@@ -44,6 +45,32 @@ def format_datetime_for_api(dt: datetime) -> str:
     # Return ISO format with Z suffix for UTC
     return dt.isoformat().replace('+00:00', 'Z')
 
+def format_timestamp_for_api(value: Optional[str]) -> Optional[str]:
+    """Format a stored timestamp string like format_datetime_for_api, without
+    parsing it into a datetime when it is already UTC or naive"""
+    if not value:
+        return value
+    
+    if value.endswith('Z'):
+        base = value[:-1]
+    elif value.endswith('+00:00'):
+        base = value[:-6]
+    elif '+' in value[19:] or '-' in value[19:]:
+        # Non-UTC offset: convert properly
+        return format_datetime_for_api(datetime.fromisoformat(value))
+    else:
+        base = value
+    
+    # "YYYY-MM-DD HH:MM:SS" (SQLite CURRENT_TIMESTAMP) -> "YYYY-MM-DDTHH:MM:SS"
+    base = base[:10] + 'T' + base[11:19] + base[19:]
+    
+    # Match datetime.isoformat(): 6-digit microseconds, omitted when zero
+    if len(base) > 19:
+        micros = (base[20:] + '000000')[:6]
+        base = base[:19] if micros == '000000' else base[:19] + '.' + micros
+    
+    return base + 'Z'
+
 def convert_to_user_timezone(dt: datetime, user_timezone: str) -> datetime:
     """Convert UTC datetime to user's timezone"""
     if dt is None:
@@ -61,6 +88,7 @@ def convert_to_user_timezone(dt: datetime, user_timezone: str) -> datetime:
         # Fall back to UTC if timezone is invalid
         return dt
 
+@lru_cache(maxsize=1024)
 def validate_timezone(timezone_str: str) -> bool:
     """Validate if timezone string is valid"""
     try:
@@ -1,7 +1,13 @@
 import re
-from typing import Optional
+import sqlite3
+from typing import Callable, Optional, Sequence
+import orjson
+from fastapi.responses import StreamingResponse
 from .database import get_db
 
+# Rows encoded per chunk when streaming JSON arrays
+STREAM_BATCH_SIZE = 200
+
 def generate_safe_name(display_name: str) -> str:
     """Convert display name to filesystem-safe name"""
     # Convert to lowercase
@@ -19,39 +25,58 @@ def generate_safe_name(display_name: str) -> str:
         safe = 'script'
     return safe
 
-def ensure_unique_safe_name(safe_name: str, folder_id: Optional[int] = None, exclude_id: Optional[int] = None) -> str:
-    """Ensure safe name is unique within folder"""
-    with get_db() as conn:
-        base_name = safe_name
-        counter = 1
+def ensure_unique_safe_name(safe_name: str, folder_id: Optional[int] = None, exclude_id: Optional[int] = None,
+                            conn: Optional[sqlite3.Connection] = None) -> str:
+    """Ensure safe name is unique within folder (reuses conn when the caller holds one)"""
+    if conn is None:
+        with get_db() as conn:
+            return ensure_unique_safe_name(safe_name, folder_id, exclude_id, conn)
+    
+    base_name = safe_name
+    counter = 1
+    
+    while True:
+        # Check if name exists (excluding current script if updating)
+        query = "SELECT id FROM scripts WHERE safe_name = ? AND folder_id = ?"
+        params = [safe_name, folder_id]
         
-        while True:
-            # Check if name exists (excluding current script if updating)
-            query = "SELECT id FROM scripts WHERE safe_name = ? AND folder_id = ?"
-            params = [safe_name, folder_id]
-            
-            if exclude_id:
-                query += " AND id != ?"
-                params.append(exclude_id)
-            
-            cursor = conn.execute(query, params)
-            if not cursor.fetchone():
-                return safe_name
-            
-            counter += 1
-            safe_name = f"{base_name}-{counter}"
+        if exclude_id:
+            query += " AND id != ?"
+            params.append(exclude_id)
+        
+        cursor = conn.execute(query, params)
+        if not cursor.fetchone():
+            return safe_name
+        
+        counter += 1
+        safe_name = f"{base_name}-{counter}"
+
+# folder id -> folder path; cleared by invalidate_folder_paths() when folders change
+_folder_path_cache = {}
 
-def get_folder_path(folder_id: Optional[int]) -> str:
-    """Get folder path for filesystem organization"""
+def invalidate_folder_paths():
+    """Forget cached folder paths after a folder is renamed or deleted"""
+    _folder_path_cache.clear()
+
+def get_folder_path(folder_id: Optional[int], conn: Optional[sqlite3.Connection] = None) -> str:
+    """Get folder path for filesystem organization (reuses conn when the caller holds one)"""
     if not folder_id:
         return ""
     
-    with get_db() as conn:
-        cursor = conn.execute("SELECT name FROM folders WHERE id = ?", (folder_id,))
-        folder = cursor.fetchone()
-        if folder:
-            return folder["name"]
-        return ""
+    cached = _folder_path_cache.get(folder_id)
+    if cached is not None:
+        return cached
+    
+    if conn is None:
+        with get_db() as conn:
+            return get_folder_path(folder_id, conn)
+    
+    cursor = conn.execute("SELECT name FROM folders WHERE id = ?", (folder_id,))
+    folder = cursor.fetchone()
+    if folder:
+        _folder_path_cache[folder_id] = folder["name"]
+        return folder["name"]
+    return ""
 
 def validate_python_version(version: str) -> bool:
     """Validate Python version format"""
@@ -86,4 +111,41 @@ def truncate_text(text: str, max_length: int = 1000) -> str:
     """Truncate text to maximum length"""
     if len(text) <= max_length:
         return text
-    return text[:max_length] + "..."
\ No newline at end of file
+    return text[:max_length] + "..."
+
+def stream_json_array(query: str, params: Sequence = (), transform: Callable = dict) -> StreamingResponse:
+    """Stream query rows as a JSON array without materializing the full result"""
+    def generate():
+        with get_db() as conn:
+            cursor = conn.execute(query, params)
+            try:
+                yield b"["
+                separator = b""
+                while True:
+                    rows = cursor.fetchmany(STREAM_BATCH_SIZE)
+                    if not rows:
+                        break
+                    # One dumps call per batch; strip the list brackets
+                    yield separator + orjson.dumps([transform(row) for row in rows])[1:-1]
+                    separator = b","
+                yield b"]"
+            finally:
+                cursor.close()
+    
+    return StreamingResponse(generate(), media_type="application/json")
+
+def stream_ndjson(query: str, params: Sequence = (), transform: Callable = dict) -> StreamingResponse:
+    """Stream query rows as newline-delimited JSON, one object per line"""
+    def generate():
+        with get_db() as conn:
+            cursor = conn.execute(query, params)
+            try:
+                while True:
+                    rows = cursor.fetchmany(STREAM_BATCH_SIZE)
+                    if not rows:
+                        break
+                    yield b"".join(orjson.dumps(transform(row), option=orjson.OPT_APPEND_NEWLINE) for row in rows)
+            finally:
+                cursor.close()
+    
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
@@ -5,6 +5,20 @@ from pathlib import Path
 from typing import Dict, Any, Optional
 import json
 import shutil
+import weakref
+
+# Concurrent venv creations / pip installs allowed per event loop
+VENV_BUILD_CONCURRENCY = int(os.getenv("TEMPO_VENV_BUILD_CONCURRENCY", "2"))
+
+_build_semaphores = weakref.WeakKeyDictionary()
+
+def _venv_build_slot() -> asyncio.Semaphore:
+    """Semaphore bounding venv builds on the running loop (Celery tasks each run their own loop)"""
+    loop = asyncio.get_running_loop()
+    semaphore = _build_semaphores.get(loop)
+    if semaphore is None:
+        semaphore = _build_semaphores[loop] = asyncio.Semaphore(VENV_BUILD_CONCURRENCY)
+    return semaphore
 
 class VirtualEnvironmentManager:
     def __init__(self, safe_name: str, folder_path: str = ""):
@@ -27,6 +41,10 @@ class VirtualEnvironmentManager:
     
     async def create_environment(self, python_version: str = "3.12") -> Dict[str, Any]:
         """Create virtual environment"""
+        async with _venv_build_slot():
+            return await self._create_environment(python_version)
+    
+    async def _create_environment(self, python_version: str) -> Dict[str, Any]:
         try:
             # Create directory structure
             self.script_path.mkdir(parents=True, exist_ok=True)
@@ -34,19 +52,8 @@ class VirtualEnvironmentManager:
             # Determine Python executable
             python_executable = f"python{python_version}"
             
-            # Try to find the Python executable
-            try:
-                result = await asyncio.create_subprocess_exec(
-                    "which", python_executable,
-                    stdout=asyncio.subprocess.PIPE,
-                    stderr=asyncio.subprocess.PIPE
-                )
-                stdout, stderr = await result.communicate()
-                
-                if result.returncode != 0:
-                    # Fallback to python3 if specific version not found
-                    python_executable = "python3"
-            except:
+            # Fallback to python3 if specific version not found
+            if not shutil.which(python_executable):
                 python_executable = "python3"
             
             # Create virtual environment
@@ -70,7 +77,7 @@ class VirtualEnvironmentManager:
             
             if pip_path.exists():
                 process = await asyncio.create_subprocess_exec(
-                    str(pip_path), "install", "--upgrade", "pip",
+                    str(pip_path), "install", "--disable-pip-version-check", "--upgrade", "pip",
                     stdout=asyncio.subprocess.PIPE,
                     stderr=asyncio.subprocess.PIPE
                 )
@@ -86,9 +93,13 @@ class VirtualEnvironmentManager:
         if not requirements.strip():
             return {"success": True, "message": "No requirements to install"}
         
+        async with _venv_build_slot():
+            return await self._install_requirements(requirements)
+    
+    async def _install_requirements(self, requirements: str) -> Dict[str, Any]:
         try:
             # Write requirements file
-            self.requirements_file.write_text(requirements)
+            await asyncio.to_thread(self.requirements_file.write_text, requirements)
             
             # Install requirements
             pip_path = self.venv_path / "bin" / "pip"
@@ -99,7 +110,7 @@ class VirtualEnvironmentManager:
                 return {"success": False, "error": "pip not found in virtual environment"}
             
             process = await asyncio.create_subprocess_exec(
-                str(pip_path), "install", "-r", str(self.requirements_file),
+                str(pip_path), "install", "--disable-pip-version-check", "-r", str(self.requirements_file),
                 stdout=asyncio.subprocess.PIPE,
                 stderr=asyncio.subprocess.PIPE
             )
@@ -119,7 +130,7 @@ class VirtualEnvironmentManager:
         """Execute script in virtual environment with custom env vars"""
         try:
             # Write script file
-            self.script_file.write_text(content)
+            await asyncio.to_thread(self.script_file.write_text, content)
             
             # Prepare environment variables
             env = os.environ.copy()
@@ -28,4 +28,4 @@ sleep 3
 
 # Start FastAPI directly on port 8000
 echo "Starting FastAPI..."
-exec python -m uvicorn backend.main:app --host 0.0.0.0 --port 8000 --reload
\ No newline at end of file
+exec python -m uvicorn backend.main:app --host 0.0.0.0 --port 8000 --reload --loop uvloop
\ No newline at end of file
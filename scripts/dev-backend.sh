@@ -15,4 +15,4 @@ if [ -f .env ]; then
 fi
 
 # Start FastAPI with hot reload
-uvicorn backend.main:app --host 0.0.0.0 --port 8000 --reload
\ No newline at end of file
+uvicorn backend.main:app --host 0.0.0.0 --port 8000 --reload --loop uvloop
\ No newline at end of file